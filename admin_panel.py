@@ -1,12 +1,13 @@
-import json
 import asyncio
 from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
+from stats_store import StatsStore
 
 class AdminPanel:
-    def __init__(self, admin_ids):
+    def __init__(self, admin_ids, stats_store=None):
         self.admin_ids = admin_ids
+        self.stats_store = stats_store or StatsStore()
         
     def is_admin(self, user_id):
         """التحقق من صلاحيات المشرف"""
@@ -40,23 +41,22 @@ class AdminPanel:
     async def detailed_stats(self, query):
         """إحصائيات مفصلة للمشرف"""
         try:
-            with open('stats.json', 'r', encoding='utf-8') as f:
-                stats = json.load(f)
+            stats = await asyncio.to_thread(self.stats_store.summary)
             
             # حساب إحصائيات إضافية
-            total_users = len(stats.get('users', []))
-            total_downloads = stats.get('total_downloads', 0)
+            total_users = stats['total_users']
+            total_downloads = stats['total_downloads']
             
-            # إحصائيات اليوم
-            today = datetime.now().date()
-            daily_downloads = 0  # يمكن تحسينها بحفظ تواريخ التحميل
+            # إحصائيات اليوم من التجميعات اليومية المفهرسة
+            daily_downloads = stats['today_downloads']
+            new_users_today = stats['today_new_users']
             
             stats_text = f"""
 📊 **إحصائيات مفصلة**
 
 👥 **المستخدمين:**
 • إجمالي المستخدمين: {total_users:,}
-• مستخدمين جدد اليوم: {daily_downloads}
+• مستخدمين جدد اليوم: {new_users_today}
 
 📥 **التحميلات:**
 • إجمالي التحميلات: {total_downloads:,}
@@ -0,0 +1,23 @@
+import os
+import json
+import tempfile
+import contextlib
+
+
+def write_json_atomic(path, data, indent=None):
+    """كتابة JSON بشكل ذري: ملف مؤقت فريد في نفس المجلد ثم os.replace
+
+    اسم الملف المؤقت فريد لكل كتابة، فلا تتداخل الكتابات المتزامنة لنفس
+    المسار ولا يرى القارئ ملفاً نصف مكتوب.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
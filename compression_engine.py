@@ -0,0 +1,165 @@
+import os
+import logging
+from media_processor import MediaProcessError
+
+logger = logging.getLogger(__name__)
+
+# الارتفاعات المسموحة عند تصغير الدقة
+RESOLUTION_LADDER = [1080, 720, 576, 480, 360, 240]
+# أقل عدد بتات لكل بكسل في الإطار قبل أن تسوء جودة x264 بوضوح
+MIN_BITS_PER_PIXEL = 0.06
+# هامش لحاوية MP4
+CONTAINER_OVERHEAD = 0.97
+
+
+class CompressionEngine:
+    """محرك ضغط يستهدف حجماً محدداً: ABR بمرحلتين، CRF محدود، وتصغير الدقة
+
+    يختار الاستراتيجية والدقة من دقة المصدر والحجم المطلوب، ثم يتحقق من حجم
+    الناتج ويعيد المحاولة بمعدل أقل فقط عند التجاوز.
+    """
+
+    def __init__(self, media, strategy=None, max_attempts=3):
+        self.media = media
+        self.strategy = strategy or os.getenv("COMPRESS_STRATEGY", "auto")
+        self.max_attempts = max_attempts
+
+    async def compress(self, input_path, output_path, target_size_mb, on_progress=None, preset='medium', strategy=None, threads=None):
+        """ضغط الملف إلى output_path بحجم لا يتجاوز target_size_mb - يرجع True عند النجاح"""
+        source = await self.analyze(input_path)
+        if not source['duration']:
+            raise MediaProcessError("مدة الفيديو غير معروفة")
+
+        target_bytes = target_size_mb * 1024 * 1024
+        video_kbps, audio_kbps = self.plan_bitrates(source, target_size_mb)
+        strategy = self.choose_strategy(source, video_kbps, strategy or self.strategy)
+
+        for attempt in range(self.max_attempts):
+            height = self.choose_height(source, video_kbps)
+            logger.info(f"🗜️ ضغط ({strategy}/{preset}) بمعدل {video_kbps}k وارتفاع {height or source['height']} - محاولة {attempt + 1}")
+
+            if strategy == 'crf':
+                await self._encode_crf(input_path, output_path, source, video_kbps, audio_kbps, height, preset, threads, on_progress)
+            else:
+                await self._encode_two_pass(input_path, output_path, source, video_kbps, audio_kbps, height, preset, threads, on_progress)
+
+            actual = os.path.getsize(output_path)
+            if actual <= target_bytes:
+                return True
+
+            # تجاوز الحجم: تقليل المعدل بنسبة التجاوز مع هامش واستخدام المرحلتين
+            logger.warning(f"⚠️ الناتج {actual / 1024 / 1024:.0f} ميجا أكبر من الهدف، إعادة المحاولة")
+            video_kbps = max(100, int(video_kbps * target_bytes / actual * 0.95))
+            strategy = 'two_pass'
+
+        return False
+
+    async def analyze(self, input_path):
+        """قراءة المدة والدقة ومعدل الإطارات ووجود الصوت"""
+        info = await self.media.probe(input_path)
+        video = next((s for s in info.get('streams', []) if s.get('codec_type') == 'video'), {})
+        has_audio = any(s.get('codec_type') == 'audio' for s in info.get('streams', []))
+
+        fps = 30.0
+        try:
+            num, den = video.get('avg_frame_rate', '30/1').split('/')
+            fps = float(num) / float(den) or 30.0
+        except (ValueError, ZeroDivisionError):
+            pass
+
+        fmt = info.get('format', {})
+        return {
+            'duration': float(fmt.get('duration') or 0),
+            'bitrate_kbps': int(fmt.get('bit_rate') or 0) // 1000,
+            'width': int(video.get('width') or 0),
+            'height': int(video.get('height') or 0),
+            'fps': fps,
+            'has_audio': has_audio,
+        }
+
+    def plan_bitrates(self, source, target_size_mb):
+        """توزيع ميزانية الحجم بين الفيديو والصوت (كيلوبت/ثانية)"""
+        total_kbps = int(target_size_mb * 8 * 1024 / source['duration'] * CONTAINER_OVERHEAD)
+        audio_kbps = 0
+        if source['has_audio']:
+            audio_kbps = 128 if total_kbps > 1000 else 64
+        return max(100, total_kbps - audio_kbps), audio_kbps
+
+    def choose_height(self, source, video_kbps):
+        """أعلى ارتفاع يحافظ على حد أدنى من البتات لكل بكسل (None = بدون تغيير)"""
+        width, height = source['width'], source['height']
+        if not width or not height:
+            return None
+
+        for candidate in [height] + [h for h in RESOLUTION_LADDER if h < height]:
+            candidate_width = width * candidate / height
+            bpp = video_kbps * 1000 / (candidate_width * candidate * source['fps'])
+            if bpp >= MIN_BITS_PER_PIXEL:
+                return None if candidate == height else candidate
+        return RESOLUTION_LADDER[-1] if height > RESOLUTION_LADDER[-1] else None
+
+    def choose_strategy(self, source, video_kbps, strategy):
+        """auto: CRF محدود عندما يكون التخفيض بسيطاً، وإلا ABR بمرحلتين"""
+        if strategy in ('crf', 'two_pass'):
+            return strategy
+        if source['bitrate_kbps'] and source['bitrate_kbps'] <= video_kbps * 1.5:
+            return 'crf'
+        return 'two_pass'
+
+    def _common_args(self, height, preset, threads=None):
+        """إعدادات الترميز المشتركة"""
+        args = ['-c:v', 'libx264', '-preset', preset, '-pix_fmt', 'yuv420p']
+        if height:
+            args += ['-vf', f'scale=-2:{height}']
+        if threads:
+            args += ['-threads', str(threads)]
+        return args
+
+    def _audio_args(self, audio_kbps):
+        """إعدادات الصوت"""
+        if not audio_kbps:
+            return ['-an']
+        return ['-c:a', 'aac', '-b:a', f'{audio_kbps}k']
+
+    async def _encode_crf(self, input_path, output_path, source, video_kbps, audio_kbps, height, preset, threads, on_progress):
+        """مرحلة واحدة بجودة ثابتة مع سقف للمعدل"""
+        args = ['-i', input_path] + self._common_args(height, preset, threads) + [
+            '-crf', os.getenv("COMPRESS_CRF", "23"),
+            '-maxrate', f'{video_kbps}k',
+            '-bufsize', f'{video_kbps * 2}k',
+        ] + self._audio_args(audio_kbps) + ['-movflags', '+faststart', output_path, '-y']
+        await self.media.ffmpeg(args, duration=source['duration'], on_progress=on_progress)
+
+    async def _encode_two_pass(self, input_path, output_path, source, video_kbps, audio_kbps, height, preset, threads, on_progress):
+        """ABR حقيقي بمرحلتين لدقة أعلى في الحجم"""
+        passlog = f"{os.path.splitext(output_path)[0]}_passlog"
+        common = self._common_args(height, preset, threads) + [
+            '-b:v', f'{video_kbps}k',
+            '-maxrate', f'{int(video_kbps * 1.5)}k',
+            '-bufsize', f'{video_kbps * 2}k',
+            '-passlogfile', passlog,
+        ]
+
+        async def first_half(fraction, speed):
+            if on_progress:
+                await on_progress(fraction / 2, speed)
+
+        async def second_half(fraction, speed):
+            if on_progress:
+                await on_progress(0.5 + fraction / 2, speed)
+
+        try:
+            await self.media.ffmpeg(['-i', input_path] + common + ['-pass', '1', '-an', '-f', 'null', os.devnull, '-y'],
+                                    duration=source['duration'], on_progress=first_half)
+            await self.media.ffmpeg(['-i', input_path] + common + ['-pass', '2'] + self._audio_args(audio_kbps)
+                                    + ['-movflags', '+faststart', output_path, '-y'],
+                                    duration=source['duration'], on_progress=second_half)
+        finally:
+            directory = os.path.dirname(passlog) or '.'
+            prefix = os.path.basename(passlog)
+            for name in os.listdir(directory):
+                if name.startswith(prefix):
+                    try:
+                        os.remove(os.path.join(directory, name))
+                    except OSError:
+                        pass
@@ -0,0 +1,183 @@
+import os
+import time
+import shutil
+import asyncio
+import contextvars
+import logging
+
+logger = logging.getLogger(__name__)
+
+# حجز المهمة الجارية (ترثه المهام الفرعية تلقائياً)
+_current_reservation = contextvars.ContextVar('disk_reservation', default=None)
+
+
+class DiskSpaceError(Exception):
+    """المساحة الحرة لا تكفي للمهمة"""
+
+
+def current_reservation():
+    """حجز المساحة الخاص بالمهمة الحالية (أو None)"""
+    return _current_reservation.get()
+
+
+class Reservation:
+    """مساحة محجوزة لمهمة واحدة مع الملفات المؤقتة التابعة لها"""
+
+    def __init__(self, manager, nbytes):
+        self.manager = manager
+        self.nbytes = nbytes
+        self.paths = set()
+        self._token = None
+
+    def track(self, path):
+        """تسجيل ملف أو مجلد مؤقت تابع للمهمة (لا يحذفه المنظف أثناء عملها)"""
+        path = os.path.abspath(path)
+        self.paths.add(path)
+        self.manager._active.add(path)
+
+    def used(self):
+        """البايتات التي كتبتها المهمة فعلاً في ملفاتها المسجلة"""
+        total = 0
+        for path in self.paths:
+            if os.path.isfile(path):
+                total += os.path.getsize(path)
+                continue
+            for dirpath, _, filenames in os.walk(path):
+                for name in filenames:
+                    try:
+                        total += os.path.getsize(os.path.join(dirpath, name))
+                    except OSError:
+                        pass  # ملف حذف أثناء العد
+        return total
+
+    def outstanding(self):
+        """الجزء غير المستخدم من الحجز (ما لم يخرج بعد من المساحة الحرة)"""
+        return max(0, self.nbytes - self.used())
+
+    def release(self):
+        """تحرير المساحة المحجوزة"""
+        self.manager._release(self)
+
+    async def __aenter__(self):
+        self._token = _current_reservation.set(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        _current_reservation.reset(self._token)
+        self.release()
+
+
+class DiskManager:
+    """إدارة مساحة مجلد التحميل: حجز قبل المهمة، انتظار أو رفض، ومنظف دوري
+
+    يُحجز الحجم التقديري قبل بدء المهمة؛ إذا لم تكف المساحة الحرة (بعد ترك
+    reserve_mb احتياطياً) تبقى المهمة في قائمة الانتظار حتى wait_timeout
+    (JobScheduler)، وترفض فوراً إذا كانت أكبر من كل المساحة الممكنة. ما
+    كتبته المهام الجارية خرج من المساحة الحرة فلا يحسب من حجوزاتها مرتين.
+    """
+
+    def __init__(self, root="downloads", reserve_mb=None, quota_mb=None, wait_timeout=None,
+                 janitor_interval=None, max_age=None):
+        self.root = root
+        self.reserve_bytes = (reserve_mb or int(os.getenv("DISK_RESERVE_MB", "500"))) * 1024 * 1024
+        # حد أقصى لمجموع الحجوزات (0 = بدون حد غير المساحة الحرة)
+        self.quota_bytes = (quota_mb if quota_mb is not None else int(os.getenv("DISK_QUOTA_MB", "0"))) * 1024 * 1024
+        self.wait_timeout = wait_timeout or float(os.getenv("DISK_WAIT_TIMEOUT", "300"))
+        self.janitor_interval = janitor_interval or float(os.getenv("DISK_JANITOR_INTERVAL", "600"))
+        self.max_age = max_age or float(os.getenv("DISK_MAX_AGE", "7200"))
+
+        os.makedirs(root, exist_ok=True)
+        self._reservations = set()
+        self._active = set()
+        self._task = None
+
+    @property
+    def reserved(self):
+        """مجموع البايتات المحجوزة حالياً"""
+        return sum(r.nbytes for r in self._reservations)
+
+    def free_bytes(self):
+        """المساحة الحرة الفعلية على القرص"""
+        return shutil.disk_usage(self.root).free
+
+    def available(self):
+        """المساحة المتاحة للحجز الجديد (الحرة ناقص ما لم يستخدم بعد من الحجوزات)"""
+        available = self.free_bytes() - self.reserve_bytes - sum(r.outstanding() for r in self._reservations)
+        if self.quota_bytes:
+            available = min(available, self.quota_bytes - self.reserved)
+        return available
+
+    def capacity(self):
+        """أقصى ما يمكن حجزه لو انتهت كل المهام الجارية وحذفت ملفاتها"""
+        capacity = self.free_bytes() - self.reserve_bytes + sum(r.used() for r in self._reservations)
+        if self.quota_bytes:
+            capacity = min(capacity, self.quota_bytes)
+        return capacity
+
+    def reserve(self, nbytes):
+        """حجز nbytes إن توفرت الآن - يرجع None إذا يجب الانتظار
+
+        يرفع DiskSpaceError إذا كانت أكبر من كل المساحة الممكنة.
+        """
+        nbytes = max(0, int(nbytes))
+        if nbytes > self.capacity():
+            raise DiskSpaceError(f"المساحة المطلوبة {nbytes / 1024 / 1024:.0f} ميجا غير متوفرة")
+        if nbytes > self.available():
+            return None
+        reservation = Reservation(self, nbytes)
+        self._reservations.add(reservation)
+        return reservation
+
+    def protect(self, path):
+        """حماية مسار من المنظف قبل ربطه بحجز (مثل مهمة تنتظر الاستئناف)"""
+        self._active.add(os.path.abspath(path))
+
+    def _release(self, reservation):
+        """إزالة الحجز"""
+        self._reservations.discard(reservation)
+        self._active -= reservation.paths
+
+    def start(self):
+        """تشغيل المنظف الدوري"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._janitor_loop())
+
+    async def stop(self):
+        """إيقاف المنظف الدوري"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def sweep(self):
+        """حذف الملفات والمجلدات اليتيمة الأقدم من max_age - يرجع عدد المحذوفات"""
+        now = time.time()
+        removed = 0
+        for entry in os.scandir(self.root):
+            if os.path.abspath(entry.path) in self._active:
+                continue
+            try:
+                if now - entry.stat(follow_symlinks=False).st_mtime < self.max_age:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.remove(entry.path)
+                removed += 1
+            except OSError as e:
+                logger.error(f"خطأ في حذف {entry.path}: {e}")
+        return removed
+
+    async def _janitor_loop(self):
+        """حلقة التنظيف الدورية"""
+        while True:
+            try:
+                removed = await asyncio.to_thread(self.sweep)
+                if removed:
+                    logger.info(f"🧹 حذف {removed} ملف/مجلد يتيم من {self.root}")
+            except Exception as e:
+                logger.error(f"خطأ في التنظيف: {e}")
+            await asyncio.sleep(self.janitor_interval)
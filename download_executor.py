@@ -0,0 +1,136 @@
+import os
+import time
+import asyncio
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import yt_dlp
+from ydl_pool import YoutubeDLPool
+
+logger = logging.getLogger(__name__)
+
+# نسخ YoutubeDL المعاد استخدامها (لكل عملية عاملة مجموعتها الخاصة)
+_ydl_pool = YoutubeDLPool()
+
+
+def _extract_info(ydl_opts, url):
+    """استخراج معلومات الرابط داخل العامل"""
+    return _ydl_pool.extract_info(ydl_opts, url)
+
+
+def _download(ydl_opts, url):
+    """تحميل الرابط داخل العامل وإرجاع مسارات الملفات النهائية"""
+    # إعدادات التحميل خاصة بكل مهمة (المسار والتقدم) لذا تنشأ نسخة جديدة تشارك الكوكيز فقط
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        _ydl_pool.share_cookies(ydl)
+        info = ydl.extract_info(url, download=True)
+    return final_paths(info)
+
+
+def final_paths(info):
+    """مسارات الملفات بعد المعالجة من requested_downloads في info_dict"""
+    if not info:
+        return []
+    paths = []
+    for entry in info.get('entries') or [info]:
+        if not entry:
+            continue
+        for download in entry.get('requested_downloads') or []:
+            path = download.get('filepath') or download.get('_filename')
+            if path and os.path.exists(path):
+                paths.append(path)
+    return paths
+
+
+class DownloadExecutor:
+    """منفذ مهام yt-dlp خارج حلقة الأحداث (خيوط أو عمليات)
+
+    للاستخراج مجموعة عمال مستقلة عن التحميل: التحميل يشغل عامله طوال
+    النقل، فلا يجب أن تنتظر معاينة رابط جديد انتهاء التحميلات الجارية.
+    """
+
+    def __init__(self, max_workers=None, mode=None, profiles=None, extract_workers=None):
+        # لا يقل عن عدد المهام المتزامنة في قائمة الانتظار
+        self.max_workers = max_workers or max(int(os.getenv("DOWNLOAD_WORKERS", "4")),
+                                              int(os.getenv("JOB_WORKERS", "4")))
+        self.extract_workers = extract_workers or int(os.getenv("EXTRACT_WORKERS", "4"))
+        # إعدادات التحميل لكل منصة وقياس السرعة (اختياري)
+        self.profiles = profiles
+        self.mode = (mode or os.getenv("DOWNLOAD_EXECUTOR_MODE", "thread")).lower()
+        if self.mode != "process":
+            self.mode = "thread"
+
+        self._pool = self._make_pool(self.max_workers, "download")
+        self._extract_pool = self._make_pool(self.extract_workers, "extract")
+
+        # المهام الجارية: رقم المهمة -> future
+        self._jobs = {}
+        self._job_ids = itertools.count(1)
+
+        logger.info(f"⚙️ منفذ التحميل: {self.mode} × {self.max_workers} (استخراج × {self.extract_workers})")
+
+    def _make_pool(self, workers, name):
+        """مجموعة عمال حسب نوع المنفذ"""
+        if self.mode == "process":
+            return ProcessPoolExecutor(max_workers=workers)
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+
+    def submit(self, func, *args, pool=None):
+        """جدولة مهمة وإرجاع future خاص بها"""
+        future = (pool or self._pool).submit(func, *args)
+        job_id = next(self._job_ids)
+        self._jobs[job_id] = future
+        future.add_done_callback(lambda f: self._jobs.pop(job_id, None))
+        return future
+
+    async def run(self, func, *args, pool=None):
+        """تشغيل دالة متزامنة في المنفذ وانتظار نتيجتها"""
+        return await asyncio.wrap_future(self.submit(func, *args, pool=pool))
+
+    async def extract_info(self, ydl_opts, url):
+        """استخراج المعلومات بدون تجميد حلقة الأحداث (في مجموعة الاستخراج)"""
+        return await self.run(_extract_info, self._prepare_opts(ydl_opts), url, pool=self._extract_pool)
+
+    async def download(self, ydl_opts, url, reporter=None, platform=None, size_mb=0):
+        """تحميل الرابط بدون تجميد حلقة الأحداث مع تقرير تقدم اختياري
+
+        يرجع قائمة مسارات الملفات النهائية (فارغة عند الفشل). مع platform تضاف
+        إعدادات المنصة (الإعدادات الصريحة في ydl_opts لها الأولوية) وتسجل السرعة.
+        """
+        variant = None
+        if self.profiles is not None and platform:
+            profile = self.profiles.options(platform, size_mb)
+            variant = self.profiles.variant(profile)
+            ydl_opts = {**profile, **ydl_opts}
+        if reporter is not None:
+            ydl_opts = {**ydl_opts, 'progress_hooks': [reporter.hook]}
+
+        started = time.monotonic()
+        try:
+            paths = await self.run(_download, self._prepare_opts(ydl_opts), url)
+        finally:
+            if reporter is not None:
+                reporter.close()
+
+        if variant and paths:
+            nbytes = sum(os.path.getsize(p) for p in paths)
+            await asyncio.to_thread(self.profiles.record, platform, variant, nbytes, time.monotonic() - started)
+        return paths
+
+    def _prepare_opts(self, ydl_opts):
+        """تجهيز الإعدادات حسب نوع المنفذ"""
+        if self.mode == "process" and 'progress_hooks' in ydl_opts:
+            # دوال التقدم لا يمكن نقلها إلى عملية أخرى
+            ydl_opts = {k: v for k, v in ydl_opts.items() if k != 'progress_hooks'}
+        return ydl_opts
+
+    @property
+    def active_jobs(self):
+        """عدد المهام الجارية أو المنتظرة"""
+        return len(self._jobs)
+
+    def shutdown(self, wait=True):
+        """إيقاف المنفذ"""
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        self._extract_pool.shutdown(wait=wait, cancel_futures=True)
+        _ydl_pool.close()
@@ -0,0 +1,88 @@
+import os
+import json
+import shutil
+import threading
+import logging
+from atomic_json import write_json_atomic
+from platforms import get_profile
+
+logger = logging.getLogger(__name__)
+
+# الملفات الصغيرة لا تستفيد من التوازي
+SMALL_FILE_MB = 20
+
+
+class DownloadProfiles:
+    """اختيار إعدادات التحميل حسب المنصة والحجم مع قياس السرعة الفعلية
+
+    aria2c (إن وجد) يستخدم للملفات الكبيرة عبر HTTP المباشر فقط، ويترك
+    لاحقاً إذا كانت سرعته المقاسة لمنصة ما أقل من التحميل الداخلي.
+    """
+
+    def __init__(self, stats_path=None, aria2c_min_mb=None):
+        self.stats_path = stats_path or os.getenv("DOWNLOAD_THROUGHPUT_FILE", "sessions/throughput.json")
+        self.aria2c_min_mb = aria2c_min_mb or float(os.getenv("ARIA2C_MIN_MB", "100"))
+        self.aria2c = (shutil.which('aria2c') is not None
+                       and os.getenv("DOWNLOAD_ARIA2C", "auto").lower() != "false")
+        self._lock = threading.Lock()
+        self.stats = self.load()
+
+    def load(self):
+        """تحميل السرعات المقاسة سابقاً"""
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """حفظ السرعات المقاسة بشكل ذري"""
+        with self._lock:
+            # نسخة ثابتة حتى لا تتغير السرعات أثناء الكتابة
+            data = {key: dict(entry) for key, entry in self.stats.items()}
+        write_json_atomic(self.stats_path, data, indent=2)
+
+    def options(self, platform, size_mb=0):
+        """إعدادات yt-dlp للمنصة والحجم المتوقع (الضبط الأساسي من سجل المنصات)"""
+        opts = dict(get_profile(platform).download_tuning)
+        if size_mb and size_mb < SMALL_FILE_MB:
+            opts['concurrent_fragment_downloads'] = min(opts['concurrent_fragment_downloads'], 2)
+        if self.use_aria2c(platform, size_mb):
+            # aria2c لروابط HTTP المباشرة فقط، وتبقى أجزاء DASH/HLS للتحميل الداخلي المتوازي
+            opts['external_downloader'] = {'http': 'aria2c'}
+            opts['external_downloader_args'] = {'aria2c': ['-x', '8', '-s', '8', '-k', '1M']}
+        return opts
+
+    def variant(self, opts):
+        """اسم طريقة التحميل لتسجيل سرعتها"""
+        return 'aria2c' if 'external_downloader' in opts else 'native'
+
+    def use_aria2c(self, platform, size_mb):
+        """استخدام aria2c للملفات الكبيرة ما لم يثبت أنه أبطأ لهذه المنصة"""
+        if not self.aria2c or not size_mb or size_mb < self.aria2c_min_mb:
+            return False
+        aria2c = self.throughput(platform, 'aria2c')
+        native = self.throughput(platform, 'native')
+        return not (aria2c and native and aria2c < native)
+
+    def throughput(self, platform, variant='native'):
+        """متوسط السرعة المقاسة (ميجابايت/ثانية) أو None"""
+        entry = self.stats.get(f"{platform}:{variant}")
+        return entry['mbps'] if entry else None
+
+    def record(self, platform, variant, nbytes, seconds):
+        """تسجيل سرعة تحميل مكتمل (متوسط متحرك)"""
+        if not nbytes or seconds <= 0:
+            return
+        mbps = nbytes / 1024 / 1024 / seconds
+        key = f"{platform}:{variant}"
+        with self._lock:
+            entry = self.stats.get(key) or {'mbps': mbps, 'samples': 0}
+            entry['mbps'] = round(entry['mbps'] * 0.8 + mbps * 0.2, 2) if entry['samples'] else round(mbps, 2)
+            entry['samples'] += 1
+            self.stats[key] = entry
+        logger.info(f"📶 {key}: {mbps:.1f} ميجا/ثانية (المتوسط {entry['mbps']})")
+        try:
+            self.save()
+        except Exception as e:
+            logger.error(f"خطأ في حفظ سرعات التحميل: {e}")
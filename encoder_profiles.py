@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import asyncio
+import tempfile
+import logging
+from atomic_json import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+
+class EncoderProfiles:
+    """اختيار إعداد الترميز لكل مهمة حسب ضغط قائمة الانتظار
+
+    يقيس كل preset لـ x264 على عينة قصيرة (إطارات/ثانية وحجم الناتج) ويحفظ
+    النتائج، ثم يختار إعداداً أسرع كلما زاد عدد المهام المنتظرة وإعداداً
+    أفضل ضغطاً عندما يكون البوت غير مشغول.
+    """
+
+    def __init__(self, media, presets=None, sample_seconds=None, results_path=None, busy_queue=None, pressure=None):
+        self.media = media
+        # من الأسرع للأفضل ضغطاً
+        self.presets = presets or os.getenv("ENCODER_PRESETS", "veryfast,faster,medium").split(',')
+        self.sample_seconds = sample_seconds or int(os.getenv("ENCODER_SAMPLE_SECONDS", "5"))
+        self.results_path = results_path or os.getenv("ENCODER_BENCH", "sessions/encoder_bench.json")
+        self.busy_queue = busy_queue or int(os.getenv("ENCODER_BUSY_QUEUE", "4"))
+        # دالة ترجع عدد المهام المنتظرة
+        self.pressure = pressure or (lambda: 0)
+        # خيوط x264 لكل ترميز بحيث لا تتجاوز العمليات المتزامنة عدد الأنوية
+        self.threads = max(1, (os.cpu_count() or 2) // media.max_workers)
+        self.results = self.load()
+
+    def load(self):
+        """تحميل نتائج القياس السابقة إن وجدت"""
+        try:
+            with open(self.results_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """حفظ نتائج القياس بشكل ذري"""
+        write_json_atomic(self.results_path, self.results, indent=2)
+
+    async def ensure_benchmark(self):
+        """القياس عند البداية إذا كان مفعلاً (ENCODER_BENCHMARK) ولا توجد نتائج"""
+        if self.results or os.getenv("ENCODER_BENCHMARK", "false").lower() != "true":
+            return
+        try:
+            await self.benchmark()
+        except Exception as e:
+            logger.error(f"خطأ في قياس المرمزات: {e}")
+
+    async def benchmark(self, sample_path=None):
+        """قياس سرعة وكفاءة كل preset على عينة قصيرة (أو ملف معطى)"""
+        with tempfile.TemporaryDirectory(prefix="encbench_") as workdir:
+            if sample_path is None:
+                # عينة اصطناعية 720p بحركة وتفاصيل حتى تكون القياسات معبرة
+                sample_path = os.path.join(workdir, "sample.mp4")
+                await self.media.ffmpeg([
+                    '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={self.sample_seconds}',
+                    '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '12', sample_path, '-y'
+                ], cpu_bound=False)
+
+            duration = await self.media.duration(sample_path)
+            frames = duration * 30
+            results = {}
+            for preset in self.presets:
+                output_path = os.path.join(workdir, f"{preset}.mp4")
+                started = time.monotonic()
+                await self.media.ffmpeg([
+                    '-i', sample_path, '-t', str(self.sample_seconds),
+                    '-c:v', 'libx264', '-preset', preset, '-crf', '23',
+                    '-threads', str(self.threads), '-an', output_path, '-y'
+                ])
+                elapsed = max(time.monotonic() - started, 0.001)
+                results[preset] = {
+                    'fps': round(frames / elapsed, 1),
+                    'bytes': os.path.getsize(output_path),
+                    'threads': self.threads,
+                }
+                logger.info(f"⏱️ {preset}: {results[preset]['fps']} إطار/ثانية، {results[preset]['bytes'] / 1024:.0f} كيلوبايت")
+
+        self.results = results
+        await asyncio.to_thread(self.save)
+        return results
+
+    def ranked(self):
+        """الإعدادات من الأسرع إلى الأصغر ناتجاً (حسب القياس إن وجد)
+
+        يستبعد كل preset أبطأ من سابقه دون أن يعطي ناتجاً أصغر، فيكون
+        الأخير دائماً الأفضل ضغطاً المقاس.
+        """
+        if not self.results:
+            return list(self.presets)
+        measured = sorted((p for p in self.presets if p in self.results),
+                          key=lambda p: (-self.results[p]['fps'], self.results[p]['bytes']))
+        ranked = []
+        for preset in measured:
+            if not ranked or self.results[preset]['bytes'] < self.results[ranked[-1]]['bytes']:
+                ranked.append(preset)
+        return ranked or list(self.presets)
+
+    def choose(self, queued=None):
+        """preset المهمة الحالية: الأفضل ضغطاً عند الفراغ والأسرع عند الازدحام"""
+        presets = self.ranked()
+        if queued is None:
+            try:
+                queued = self.pressure()
+            except Exception:
+                queued = 0
+        load = min(1.0, queued / self.busy_queue)
+        # 0 مهام منتظرة → الأصغر ناتجاً، busy_queue فأكثر → الأسرع
+        index = round((1 - load) * (len(presets) - 1))
+        return presets[index]
@@ -5,7 +5,10 @@ from large_file_handler import LargeFileHandler
 class EnhancedVideoBot(VideoDownloaderBot):
     def __init__(self, bot_token):
         super().__init__(bot_token)
-        self.large_file_handler = LargeFileHandler()
+        self.large_file_handler = LargeFileHandler(executor=self.executor, file_id_cache=self.file_id_cache,
+                                                   media=self.large_file_handler.media,
+                                                   encoder_profiles=self.large_file_handler.encoder_profiles,
+                                                   local_mode=bool(self.local_bot_api), journal=self.job_journal)
     
     async def process_download(self, query, context, data, user_id):
         """معالجة محسنة للتحميل"""
@@ -18,11 +21,13 @@ class EnhancedVideoBot(VideoDownloaderBot):
         url = video_data['url']
         video_info = video_data['info']
         
-        # فحص حجم الملف أولاً
-        file_info = await self.large_file_handler.check_file_size(url)
+        # حجم الملف محسوب مسبقاً عند تحليل الرابط
+        file_info = video_data.get('file_info')
+        if file_info is None:
+            file_info = await self.large_file_handler.check_file_size(url)
         
         if file_info and file_info['size_mb'] > 1000:  # أكبر من 1 جيجا
-            await self.large_file_handler.handle_large_file(query, context, url, video_info)
+            await self.large_file_handler.handle_large_file(query, context, url, video_info, file_info)
         else:
             # التحميل العادي للملفات الصغيرة
             await super().process_download(query, context, data, user_id)
@@ -0,0 +1,115 @@
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FileIdCache:
+    """تخزين دائم لمعرفات ملفات تلقرام لإعادة إرسالها بدون تحميل أو رفع"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.getenv("FILE_ID_DB", "sessions/file_ids.db")
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_ids (
+                video_key TEXT NOT NULL,
+                quality TEXT NOT NULL,
+                format TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                media_type TEXT NOT NULL,
+                size_bytes INTEGER DEFAULT 0,
+                created REAL NOT NULL,
+                PRIMARY KEY (video_key, quality, format)
+            )
+        """)
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(video_info, quality, fmt):
+        """بناء مفتاح (معرف الفيديو، الجودة، الصيغة) أو None إذا لم يعرف المعرف"""
+        video_id = video_info.get('id') if video_info else None
+        if not video_id:
+            return None
+        return (f"{video_info.get('extractor_key') or 'generic'}:{video_id}", quality, fmt)
+
+    @staticmethod
+    def extract_file_id(message):
+        """استخراج (file_id، النوع، الحجم) من رسالة مرسلة"""
+        for media_type in ('video', 'audio', 'document'):
+            media = getattr(message, media_type, None)
+            if media:
+                return media.file_id, media_type, media.file_size or 0
+        return None
+
+    async def get(self, key):
+        """جلب السجل المخزن للمفتاح"""
+        row = await asyncio.to_thread(self._query,
+            "SELECT file_id, media_type, size_bytes FROM file_ids WHERE video_key=? AND quality=? AND format=?", key)
+        if row:
+            self.hits += 1
+            return {'file_id': row[0], 'media_type': row[1], 'size_bytes': row[2]}
+        self.misses += 1
+        return None
+
+    async def put(self, key, message):
+        """تسجيل معرف الملف من رسالة تلقرام المرسلة"""
+        if not key or message is None:
+            return
+        extracted = self.extract_file_id(message)
+        if not extracted:
+            return
+        file_id, media_type, size_bytes = extracted
+        try:
+            await asyncio.to_thread(self._execute,
+                "INSERT OR REPLACE INTO file_ids VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, file_id, media_type, size_bytes, time.time()))
+        except Exception as e:
+            logger.warning(f"⚠️ فشل حفظ معرف الملف: {e}")
+
+    async def delete(self, key):
+        """حذف سجل لم يعد صالحاً"""
+        await asyncio.to_thread(self._execute,
+            "DELETE FROM file_ids WHERE video_key=? AND quality=? AND format=?", key)
+
+    async def resend(self, message_obj, key, caption, title=None):
+        """إعادة إرسال ملف مخزن عبر file_id - يرجع True عند النجاح"""
+        if not key:
+            return False
+        cached = await self.get(key)
+        if not cached:
+            return False
+
+        try:
+            if cached['media_type'] == 'audio':
+                await message_obj.reply_audio(audio=cached['file_id'], caption=caption, title=title)
+            elif cached['media_type'] == 'video':
+                await message_obj.reply_video(video=cached['file_id'], caption=caption, supports_streaming=True)
+            else:
+                await message_obj.reply_document(document=cached['file_id'], caption=caption)
+            logger.info(f"⚡ إعادة إرسال من الذاكرة: {key}")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ معرف ملف غير صالح {key}: {e}")
+            await self.delete(key)
+            return False
+
+    def _query(self, sql, params):
+        """تنفيذ استعلام قراءة"""
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _execute(self, sql, params):
+        """تنفيذ أمر كتابة"""
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._conn.commit()
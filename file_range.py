@@ -0,0 +1,62 @@
+import io
+import os
+
+
+class FileRange(io.RawIOBase):
+    """عرض للقراءة فقط لمدى من البايتات داخل ملف بدون إنشاء نسخة مؤقتة"""
+
+    def __init__(self, path, offset, length, name=None):
+        super().__init__()
+        self._file = open(path, 'rb')
+        self.offset = offset
+        self.length = max(0, min(length, os.fstat(self._file.fileno()).st_size - offset))
+        self.name = name or os.path.basename(path)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        """الانتقال داخل المدى فقط"""
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self.length
+        self._pos = max(0, min(pos, self.length))
+        return self._pos
+
+    def readinto(self, buffer):
+        """القراءة مباشرة في المخزن المؤقت المعطى"""
+        size = min(len(buffer), self.length - self._pos)
+        if size <= 0:
+            return 0
+        self._file.seek(self.offset + self._pos)
+        read = self._file.readinto(memoryview(buffer)[:size])
+        self._pos += read
+        return read
+
+    def read(self, size=-1):
+        """قراءة حتى size بايت (أو باقي المدى) بعملية واحدة"""
+        remaining = self.length - self._pos
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if size <= 0:
+            return b""
+        self._file.seek(self.offset + self._pos)
+        data = self._file.read(size)
+        self._pos += len(data)
+        return data
+
+    def readall(self):
+        return self.read()
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
@@ -0,0 +1,88 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FormatPlanner:
+    """اختيار أفضل صيغة (فيديو+صوت) يتسع حجمها للميزانية قبل التحميل
+
+    يعتمد على قائمة formats من نتيجة الاستخراج: filesize ثم filesize_approx
+    ثم tbr × المدة، حتى لا نحمل ملفاً كاملاً ثم نضغطه.
+    """
+
+    def __init__(self, budget_mb=2000):
+        self.budget_mb = budget_mb
+
+    @staticmethod
+    def estimate_size(fmt, duration):
+        """الحجم المعروف أو التقديري للصيغة بالبايت (0 إذا كان غير معروف)"""
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if size:
+            return size
+        if fmt.get('tbr') and duration:
+            return int(fmt['tbr'] * 1000 / 8 * duration)
+        return 0
+
+    def plan(self, info, max_height=None, budget_mb=None):
+        """أفضل اختيار ضمن الميزانية: {'format', 'size_mb', 'height'} أو None"""
+        formats = info.get('formats') or []
+        duration = info.get('duration') or 0
+        budget = (budget_mb or self.budget_mb) * 1024 * 1024
+
+        videos, audios, combined = [], [], []
+        for fmt in formats:
+            if not fmt.get('format_id'):
+                continue
+            has_video = fmt.get('vcodec') not in (None, 'none')
+            has_audio = fmt.get('acodec') not in (None, 'none')
+            if has_video and max_height and (fmt.get('height') or 0) > max_height:
+                continue
+            size = self.estimate_size(fmt, duration)
+            if not size:
+                continue
+            if has_video and has_audio:
+                combined.append((fmt, size))
+            elif has_video:
+                videos.append((fmt, size))
+            elif has_audio:
+                audios.append((fmt, size))
+
+        # تفضيل صوت m4a ثم الأعلى جودة لسهولة الدمج في mp4
+        audios.sort(key=lambda a: (a[0].get('ext') == 'm4a', a[0].get('abr') or a[0].get('tbr') or 0), reverse=True)
+
+        candidates = [(fmt['format_id'], fmt, size) for fmt, size in combined if size <= budget]
+        for video, video_size in videos:
+            audio = next(((a, s) for a, s in audios if video_size + s <= budget), None)
+            if audio:
+                candidates.append((f"{video['format_id']}+{audio[0]['format_id']}", video, video_size + audio[1]))
+
+        if not candidates:
+            return None
+
+        best_id, best_fmt, best_size = max(candidates, key=lambda c: self._rank(c[1]))
+        return {
+            'format': best_id,
+            'size_mb': best_size / (1024 * 1024),
+            'height': best_fmt.get('height'),
+        }
+
+    def selector(self, info, fallback, max_height=None, budget_mb=None):
+        """محدد صيغة yt-dlp: الاختيار المخطط أولاً ثم المحدد الأصلي كاحتياط"""
+        try:
+            planned = self.plan(info or {}, max_height, budget_mb)
+        except Exception as e:
+            logger.error(f"خطأ في تخطيط الصيغة: {e}")
+            planned = None
+        if not planned:
+            return fallback
+        logger.info(f"🎯 صيغة مختارة {planned['format']} ({planned['height']}p، ~{planned['size_mb']:.0f} ميجا)")
+        return f"{planned['format']}/{fallback}"
+
+    @staticmethod
+    def _rank(fmt):
+        """الأعلى دقة أولاً، ثم H.264 (تشغيل مباشر في تلقرام)، ثم معدل البت"""
+        return (
+            fmt.get('height') or 0,
+            (fmt.get('vcodec') or '').startswith(('avc', 'h264')),
+            fmt.get('tbr') or 0,
+        )
@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# معلومات الفيديو التي تكفي لإعادة الإرسال بعد إعادة التشغيل
+INFO_FIELDS = ('title', 'duration', 'uploader', 'id', 'extractor_key')
+
+
+class JobJournal:
+    """سجل دائم لمهام التحميل الجارية لاستئنافها بعد إعادة التشغيل
+
+    تسجل كل مهمة قبل بدء التحميل (الرابط، الصيغة، المحادثة، مجلد العمل)
+    وتعلم عند انتهائها؛ ما بقي بحالة running عند البداية انقطع بسبب توقف
+    البوت ويستأنف من ملفات .part الموجودة.
+    """
+
+    def __init__(self, db_path=None, max_attempts=None, keep_days=7):
+        self.db_path = db_path or os.getenv("JOB_JOURNAL_DB", "sessions/jobs.db")
+        self.max_attempts = max_attempts or int(os.getenv("JOB_RESUME_ATTEMPTS", "3"))
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                format TEXT NOT NULL,
+                quality TEXT NOT NULL,
+                workspace TEXT NOT NULL,
+                info TEXT NOT NULL,
+                size_mb REAL DEFAULT 0,
+                state TEXT NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        # حذف سجلات المهام المنتهية القديمة
+        self._conn.execute("DELETE FROM jobs WHERE state != 'running' AND updated < ?",
+                           (time.time() - keep_days * 86400,))
+        self._conn.commit()
+
+    async def start(self, job_id, user_id, chat_id, url, format_selector, quality, workspace, video_info, size_mb=0):
+        """تسجيل مهمة قبل بدء تحميلها (أو محاولة استئناف جديدة لها)"""
+        info = {k: video_info.get(k) for k in INFO_FIELDS} if video_info else {}
+        now = time.time()
+        await asyncio.to_thread(self._execute, """
+            INSERT INTO jobs (job_id, user_id, chat_id, url, format, quality, workspace, info, size_mb,
+                              state, attempts, created, updated)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'running', 1, ?, ?)
+            ON CONFLICT(job_id) DO UPDATE SET state='running', attempts=attempts + 1, updated=excluded.updated
+        """, (job_id, user_id, chat_id, url, format_selector, quality, workspace,
+              json.dumps(info, ensure_ascii=False), size_mb or 0, now, now))
+
+    async def finish(self, job_id, state='done'):
+        """تعليم المهمة كمنتهية (done أو failed)"""
+        try:
+            await asyncio.to_thread(self._execute,
+                "UPDATE jobs SET state=?, updated=? WHERE job_id=?", (state, time.time(), job_id))
+        except Exception as e:
+            logger.error(f"خطأ في تحديث سجل المهام: {e}")
+
+    async def unfinished(self):
+        """المهام التي انقطعت (بحالة running) مع تجاوز ما استنفد محاولاته"""
+        rows = await asyncio.to_thread(self._query_all,
+            "SELECT job_id, user_id, chat_id, url, format, quality, workspace, info, size_mb, attempts "
+            "FROM jobs WHERE state='running' ORDER BY created")
+        jobs = []
+        for row in rows:
+            job = dict(zip(('job_id', 'user_id', 'chat_id', 'url', 'format', 'quality', 'workspace',
+                            'info', 'size_mb', 'attempts'), row))
+            job['info'] = json.loads(job['info'] or '{}')
+            if job['attempts'] >= self.max_attempts:
+                logger.warning(f"⚠️ تجاوز محاولات الاستئناف: {job['job_id']}")
+                await self.finish(job['job_id'], 'failed')
+                continue
+            jobs.append(job)
+        return jobs
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._conn.commit()
+
+    def _query_all(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self):
+        """إغلاق قاعدة البيانات"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,222 @@
+import os
+import time
+import asyncio
+import contextlib
+import logging
+from disk_manager import DiskSpaceError
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """قائمة الانتظار ممتلئة"""
+
+
+# مسارات التنفيذ وعدد العمال الافتراضي لكل منها
+LANES = {
+    'audio': int(os.getenv("JOB_WORKERS_AUDIO", "2")),
+    'download': int(os.getenv("JOB_WORKERS_DOWNLOAD", "3")),
+    'compress': int(os.getenv("JOB_WORKERS_COMPRESS", "1")),
+}
+
+
+class Job:
+    """مهمة في قائمة الانتظار"""
+
+    def __init__(self, user_id, factory, progress_msg=None, cost=0, lane='download', disk_bytes=0):
+        self.user_id = user_id
+        self.factory = factory
+        self.progress_msg = progress_msg
+        self.cost = cost
+        self.lane = lane
+        self.disk_bytes = disk_bytes
+        self.reservation = None
+        self.submitted = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+        self.reported_position = None
+
+
+class JobScheduler:
+    """جدولة المهام الثقيلة حسب التكلفة المتوقعة (الأقصر أولاً مع التقادم)
+
+    لكل مسار (صوت، تحميل، ضغط) عدد عمال مستقل، مع حد عام وحد لكل مستخدم
+    وقائمة انتظار محدودة. مع disk تحجز مساحة كل مهمة قبل تشغيلها: المهمة
+    التي لا تكفيها المساحة تبقى منتظرة دون أن تشغل عاملاً، وتمر المهام
+    الأصغر التي تكفيها المساحة.
+    """
+
+    def __init__(self, max_workers=None, per_user_limit=None, max_queue=None, max_pending_per_user=None,
+                 lanes=None, aging_rate=None, disk=None, disk_retry=5, report_interval=None):
+        self.max_workers = max_workers or int(os.getenv("JOB_WORKERS", "4"))
+        self.per_user_limit = per_user_limit or int(os.getenv("JOB_PER_USER", "1"))
+        self.max_queue = max_queue or int(os.getenv("JOB_QUEUE_SIZE", "50"))
+        self.max_pending_per_user = max_pending_per_user or int(os.getenv("JOB_PENDING_PER_USER", "3"))
+        self.lanes = lanes or dict(LANES)
+        # ميجابايت تُخصم من التكلفة لكل ثانية انتظار حتى لا تتجمد المهام الكبيرة
+        self.aging_rate = aging_rate or float(os.getenv("JOB_AGING_MB_PER_SEC", "5"))
+        # إدارة مساحة القرص (اختياري) وفترة إعادة فحص المهام المنتظرة للمساحة
+        self.disk = disk
+        self.disk_retry = disk_retry
+        self._disk_timer = None
+        # أقل فترة بين جولات تحديث مواقع الانتظار (ثانية)
+        self.report_interval = report_interval or float(os.getenv("JOB_POSITION_INTERVAL", "5"))
+        self._report_timer = None
+        self._last_report = 0.0
+
+        self._pending = []
+        self._running = 0
+        self._running_per_user = {}
+        self._running_per_lane = {}
+
+    async def submit(self, user_id, factory, progress_msg=None, cost=0, lane='download', disk_bytes=0):
+        """إضافة مهمة factory() وانتظار نتيجتها - يرفع QueueFullError عند الامتلاء
+
+        cost: التكلفة المتوقعة بالميجابايت، lane: مسار التنفيذ، disk_bytes:
+        المساحة المؤقتة المطلوبة (DiskSpaceError إذا لم تتوفر)
+        """
+        if len(self._pending) >= self.max_queue:
+            raise QueueFullError("قائمة الانتظار ممتلئة")
+        if sum(1 for job in self._pending if job.user_id == user_id) >= self.max_pending_per_user:
+            raise QueueFullError("لديك طلبات كثيرة في الانتظار")
+
+        if self.disk is not None and disk_bytes > self.disk.capacity():
+            raise DiskSpaceError(f"المساحة المطلوبة {disk_bytes / 1024 / 1024:.0f} ميجا غير متوفرة")
+
+        if lane not in self.lanes:
+            lane = 'download'
+        job = Job(user_id, factory, progress_msg, cost, lane, disk_bytes)
+        self._pending.append(job)
+        self._dispatch()
+        self._schedule_report()
+
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            if job in self._pending:
+                self._pending.remove(job)
+            raise
+
+    def priority(self, job, now=None):
+        """أولوية المهمة: التكلفة ناقص مكافأة الانتظار (الأقل أولاً)"""
+        waited = (now or time.monotonic()) - job.submitted
+        return job.cost - self.aging_rate * waited
+
+    def ordered_pending(self):
+        """المهام المنتظرة مرتبة حسب الأولوية الحالية"""
+        now = time.monotonic()
+        return sorted(self._pending, key=lambda job: self.priority(job, now))
+
+    def position(self, job):
+        """موقع المهمة في قائمة الانتظار (يبدأ من 1)"""
+        return self.ordered_pending().index(job) + 1
+
+    def _next_job(self):
+        """أعلى مهمة أولوية لم يتجاوز صاحبها أو مسارها الحد وتكفيها مساحة القرص"""
+        for job in self.ordered_pending():
+            if self._running_per_user.get(job.user_id, 0) >= self.per_user_limit:
+                continue
+            if self._running_per_lane.get(job.lane, 0) >= self.lanes[job.lane]:
+                continue
+            if self.disk is not None and job.disk_bytes and not self._reserve_disk(job):
+                continue
+            return job
+        return None
+
+    def _reserve_disk(self, job):
+        """حجز مساحة المهمة - يرجع False إذا يجب أن تنتظر (أو رفضت)"""
+        try:
+            job.reservation = self.disk.reserve(job.disk_bytes)
+        except DiskSpaceError:
+            # تجاوزت كل المساحة الممكنة بعد قبولها (ملفات خارج الحجوزات): تنتظر حتى المهلة
+            job.reservation = None
+        if job.reservation is not None:
+            return True
+
+        if time.monotonic() - job.submitted > self.disk.wait_timeout:
+            self._reject(job, DiskSpaceError("انتهت مهلة انتظار المساحة"))
+        elif self._disk_timer is None:
+            # المساحة قد تتحرر خارج الجدولة (المنظف، حذف ملفات): إعادة الفحص لاحقاً
+            logger.info(f"💾 انتظار مساحة: {job.disk_bytes / 1024 / 1024:.0f} ميجا")
+            self._disk_timer = asyncio.get_running_loop().call_later(self.disk_retry, self._retry_disk)
+        return False
+
+    def _retry_disk(self):
+        self._disk_timer = None
+        self._dispatch()
+
+    def _reject(self, job, error):
+        """إخراج مهمة من الانتظار مع خطأ"""
+        self._pending.remove(job)
+        if not job.future.done():
+            job.future.set_exception(error)
+
+    def _dispatch(self):
+        """تشغيل المهام المنتظرة حسب العمال المتاحين"""
+        while self._running < self.max_workers:
+            job = self._next_job()
+            if job is None:
+                break
+            self._pending.remove(job)
+            self._running += 1
+            self._running_per_user[job.user_id] = self._running_per_user.get(job.user_id, 0) + 1
+            self._running_per_lane[job.lane] = self._running_per_lane.get(job.lane, 0) + 1
+            asyncio.create_task(self._run(job))
+
+    async def _run(self, job):
+        """تنفيذ مهمة وتحرير مكانها"""
+        try:
+            # الحجز يصبح حجز المهمة الحالية (ترثه المهام الفرعية) ويحرر بانتهائها
+            async with job.reservation or contextlib.nullcontext():
+                result = await job.factory()
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as e:
+            logger.error(f"❌ فشل تنفيذ المهمة: {e}")
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self._running -= 1
+            self._running_per_user[job.user_id] -= 1
+            if not self._running_per_user[job.user_id]:
+                del self._running_per_user[job.user_id]
+            self._running_per_lane[job.lane] -= 1
+            self._dispatch()
+            self._schedule_report()
+
+    def _schedule_report(self):
+        """جمع تغيرات القائمة في جولة تحديث واحدة كل report_interval على الأكثر"""
+        if self._report_timer is not None or not self._pending:
+            return
+        loop = asyncio.get_running_loop()
+        delay = max(0.0, self._last_report + self.report_interval - time.monotonic())
+        self._report_timer = loop.call_later(delay, lambda: loop.create_task(self._report_positions()))
+
+    async def _report_positions(self):
+        """تحديث رسائل التقدم بموقع كل مهمة منتظرة"""
+        self._report_timer = None
+        self._last_report = time.monotonic()
+        for index, job in enumerate(self.ordered_pending(), start=1):
+            # المهمة بدأت أو ألغيت أثناء تحديث الرسائل السابقة
+            if job not in self._pending:
+                continue
+            if job.progress_msg is None or job.reported_position == index:
+                continue
+            job.reported_position = index
+            try:
+                await job.progress_msg.edit_text(
+                    f"⏳ طلبك في قائمة الانتظار\n\n"
+                    f"📍 **الموقع:** {index} من {len(self._pending)}\n"
+                    f"⚙️ **قيد التنفيذ:** {self._running}/{self.max_workers}"
+                )
+            except Exception:
+                pass  # تجاهل أخطاء التحديث
+
+    @property
+    def queued(self):
+        """عدد المهام المنتظرة"""
+        return len(self._pending)
+
+    @property
+    def running(self):
+        """عدد المهام الجارية"""
+        return self._running
@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import logging
+from disk_manager import current_reservation
+
+logger = logging.getLogger(__name__)
+
+# لاحقة تميز مجلدات المهام عن باقي محتويات مجلد التحميل
+WORKSPACE_SUFFIX = ".job"
+
+
+class JobWorkspace:
+    """مجلد عمل فريد لكل مهمة تحميل
+
+    يمنع تصادم أسماء الملفات بين المهام المتزامنة، ويغني عن البحث في مجلد
+    التحميل: يؤخذ المسار النهائي من نتيجة yt-dlp مباشرة.
+    """
+
+    def __init__(self, root="downloads", name="job", path=None):
+        if path:
+            # إعادة فتح مجلد مهمة سابقة (استئناف)
+            os.makedirs(path, exist_ok=True)
+            root = os.path.dirname(path)
+        else:
+            os.makedirs(root, exist_ok=True)
+            path = tempfile.mkdtemp(prefix=f"{name}_", suffix=WORKSPACE_SUFFIX, dir=root)
+        self.root = root
+        self.path = path
+        self.id = os.path.basename(self.path)
+        # ربط المجلد بحجز المهمة الحالية حتى لا يحذفه المنظف أثناء العمل
+        reservation = current_reservation()
+        if reservation is not None:
+            reservation.track(self.path)
+
+    def outtmpl(self, name="%(id)s"):
+        """قالب اسم الملف لـ yt-dlp داخل المجلد"""
+        return os.path.join(self.path, f"{name}.%(ext)s")
+
+    def adopt(self, file_path):
+        """نسخة خاصة من ملف مشترك داخل المجلد (رابط صلب بدون نسخ البايتات إن أمكن)"""
+        target = os.path.join(self.path, os.path.basename(file_path))
+        try:
+            os.link(file_path, target)
+        except OSError:
+            shutil.copy2(file_path, target)
+        return target
+
+    def cleanup(self):
+        """حذف المجلد بكل محتوياته"""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    @staticmethod
+    def discard(file_path):
+        """حذف ملف ناتج عن مهمة مع مجلد عمله (وما أنشئ بجانبه كالنسخة المضغوطة)"""
+        if not file_path:
+            return
+        parent = os.path.dirname(file_path)
+        if parent.endswith(WORKSPACE_SUFFIX):
+            shutil.rmtree(parent, ignore_errors=True)
+            return
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
@@ -1,57 +1,84 @@
 import os
 import asyncio
 import math
-import subprocess
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import time
+import shutil
+import tempfile
+import contextlib
+from pathlib import Path
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
 from telegram.ext import ContextTypes
-import yt_dlp
-from datetime import datetime
+from telegram.error import RetryAfter, NetworkError, BadRequest, TimedOut
 import logging
+from progress_reporter import ProgressReporter
+from file_range import FileRange
+from download_executor import DownloadExecutor
+from platforms import detect_platform
+from media_processor import MediaProcessor
+from compression_engine import CompressionEngine
+from format_planner import FormatPlanner
+from encoder_profiles import EncoderProfiles
+from job_workspace import JobWorkspace
 
 logger = logging.getLogger(__name__)
 
 class LargeFileHandler:
-    def __init__(self, max_size_mb=2000):  # 2 جيجا
+    def __init__(self, max_size_mb=2000, executor=None, file_id_cache=None, media=None, encoder_profiles=None,
+                 local_mode=False, journal=None):  # 2 جيجا
         self.max_size_mb = max_size_mb
-        self.telegram_limit_mb = 50  # حد تلقرام للبوتات
-        self.chunk_size_mb = 45  # حجم كل جزء للتقسيم
+        self.executor = executor or DownloadExecutor()
+        self.media = media or MediaProcessor()
+        self.compressor = CompressionEngine(self.media)
+        self.encoder_profiles = encoder_profiles or EncoderProfiles(self.media)
+        self.format_planner = FormatPlanner(max_size_mb)
+        self.file_id_cache = file_id_cache
+        # سجل المهام لاستئناف التحميلات بعد إعادة التشغيل (اختياري)
+        self.journal = journal
+        # خادم Bot API محلي: حد 2000 ميجا ورفع الملفات بمسارها
+        self.local_mode = local_mode
+        self.telegram_limit_mb = 2000 if local_mode else 50  # حد تلقرام للبوتات
+        self.chunk_size_mb = int(self.telegram_limit_mb * 0.9)  # حجم كل جزء للتقسيم (هامش تحت الحد)
+        # segment: أجزاء MP4 قابلة للتشغيل بنسخ البث، bytes: تقسيم خام
+        self.split_mode = os.getenv("SPLIT_MODE", "segment")
+        # رفع الأجزاء: عدد الأجزاء المجهزة مسبقاً ومهلة رفع كل جزء (ثانية)
+        self.upload_prefetch = int(os.getenv("UPLOAD_PREFETCH", "1"))
+        self.upload_timeout = float(os.getenv("UPLOAD_TIMEOUT", "300"))
+        self._upload_resume_at = 0.0
         
     async def check_file_size(self, url):
         """فحص حجم الملف قبل التحميل"""
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-            'socket_timeout': 30,
-        }
+        # نفس إعدادات المنصة المستخدمة في الاستخراج والتحميل
+        ydl_opts = detect_platform(url).extraction_options()
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                # البحث عن أفضل جودة متاحة
-                formats = info.get('formats', [])
-                best_format = None
-                file_size = 0
-                
-                for fmt in formats:
-                    if fmt.get('filesize'):
-                        if not best_format or fmt.get('height', 0) > best_format.get('height', 0):
-                            best_format = fmt
-                            file_size = fmt['filesize']
-                
-                return {
-                    'size_bytes': file_size,
-                    'size_mb': file_size / (1024 * 1024) if file_size else 0,
-                    'format': best_format,
-                    'title': info.get('title', 'Unknown'),
-                    'duration': info.get('duration', 0)
-                }
+            info = await self.executor.extract_info(ydl_opts, url)
+            return self.estimate_file_info(info)
         except Exception as e:
             logger.error(f"خطأ في فحص حجم الملف: {e}")
             return None
 
-    async def handle_large_file(self, update_or_query, context: ContextTypes.DEFAULT_TYPE, url, video_info):
+    def estimate_file_info(self, info):
+        """حساب حجم أفضل جودة من نتيجة استخراج موجودة بدون طلب جديد"""
+        # البحث عن أفضل جودة متاحة
+        formats = info.get('formats') or []
+        best_format = None
+        file_size = 0
+        
+        for fmt in formats:
+            if fmt.get('filesize'):
+                if not best_format or (fmt.get('height') or 0) > (best_format.get('height') or 0):
+                    best_format = fmt
+                    file_size = fmt['filesize']
+        
+        return {
+            'size_bytes': file_size,
+            'size_mb': file_size / (1024 * 1024) if file_size else 0,
+            'format': best_format,
+            'title': info.get('title', 'Unknown'),
+            'duration': info.get('duration', 0)
+        }
+
+    async def handle_large_file(self, update_or_query, context: ContextTypes.DEFAULT_TYPE, url, video_info, file_info=None):
         """معالجة الملفات الكبيرة - إصلاح المشكلة"""
         # التحقق من نوع الكائن
         if hasattr(update_or_query, 'callback_query'):
@@ -67,7 +94,11 @@ class LargeFileHandler:
             query = update_or_query
             user_id = query.from_user.id
         
-        file_info = await self.check_file_size(url)
+        # إعادة استخدام نتيجة الاستخراج السابقة إن وجدت
+        if file_info is None and video_info and 'file_info' in video_info:
+            file_info = video_info['file_info']
+        if file_info is None:
+            file_info = await self.check_file_size(url)
         
         if not file_info:
             await self.download_with_monitoring(update_or_query, url, video_info)
@@ -80,13 +111,13 @@ class LargeFileHandler:
             return
         
         if size_mb > self.max_size_mb:
-            await self.handle_oversized_file(update_or_query, file_info, url, context)
+            await self.handle_oversized_file(update_or_query, file_info, url, context, video_info)
         elif size_mb > self.telegram_limit_mb:
             await self.handle_large_download(update_or_query, file_info, url, video_info, context)
         else:
             await self.download_with_monitoring(update_or_query, url, video_info)
 
-    async def handle_oversized_file(self, update_or_query, file_info, url, context):
+    async def handle_oversized_file(self, update_or_query, file_info, url, context, video_info=None):
         """معالجة الملفات الأكبر من 2 جيجا"""
         size_gb = file_info['size_mb'] / 1024
         
@@ -124,6 +155,7 @@ class LargeFileHandler:
         # حفظ معلومات الملف
         context.user_data[f'oversized_file_{user_id}'] = {
             'url': url,
+            'info': video_info,
             'file_info': file_info
         }
         
@@ -195,49 +227,78 @@ class LargeFileHandler:
             progress_msg = await query.edit_message_text("🚀 بدء التحميل...")
             message_obj = query.message
         
-        timestamp = int(datetime.now().timestamp())
-        filename = f'downloads/large_video_{user_id}_{timestamp}.%(ext)s'
-        
-        # إعدادات خاصة للملفات الكبيرة
-        ydl_opts = {
-            'outtmpl': filename,
-            'format': 'best[filesize<2000M]/best',  # تفضيل الملفات أقل من 2 جيجا
-            'merge_output_format': 'mp4',
-            'socket_timeout': 60,
-            'retries': 3,
-            'fragment_retries': 5,
-            'progress_hooks': [lambda d: asyncio.create_task(self.enhanced_progress_hook(d, progress_msg))],
-        }
+        workspace = JobWorkspace('downloads', f"large_video_{user_id}")
+        # أفضل صيغة يتسع حجمها للحد قبل التحميل (بدلاً من الضغط بعده)
+        format_selector = self.format_planner.selector(video_info, 'best[filesize<2000M]/best')
+        size_mb = ((video_info or {}).get('file_info') or {}).get('size_mb', 0)
         
+        await self.run_journaled_download(message_obj, progress_msg, user_id, url, video_info,
+                                          format_selector, 'best', workspace, size_mb)
+
+    async def run_journaled_download(self, message_obj, progress_msg, user_id, url, video_info,
+                                     format_selector, quality, workspace, size_mb=0):
+        """تحميل في مجلد المهمة مع تسجيله في السجل ثم الإرسال
+
+        عند إيقاف البوت أثناء التحميل يبقى السجل ومجلد العمل (وملفات .part)
+        كما هي ليستأنف التحميل عند التشغيل التالي.
+        """
+        job_id = workspace.id
+        if self.journal:
+            await self.journal.start(job_id, user_id, message_obj.chat_id, url, format_selector,
+                                     quality, workspace.path, video_info, size_mb)
+        
+        # إعدادات المنصة مع إعدادات المهمة
+        platform = detect_platform(url)
+        ydl_opts = platform.download_options(
+            outtmpl=workspace.outtmpl(),
+            format=format_selector,
+            merge_output_format='mp4',
+            continuedl=True,  # إكمال ملفات .part الموجودة
+            ignoreerrors=False,  # إظهار سبب الفشل للمستخدم
+        )
+        reporter = ProgressReporter(progress_msg, self.format_progress)
+        
+        interrupted = False
+        state = 'failed'
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-                
-            # البحث عن الملف المحمل
-            download_dir = 'downloads'
-            files = [f for f in os.listdir(download_dir) if f.startswith(f'large_video_{user_id}_{timestamp}')]
+            files = await self.executor.download(ydl_opts, url, reporter,
+                                                 platform=platform.name, size_mb=size_mb)
             
             if files:
-                file_path = os.path.join(download_dir, files[0])
+                file_path = files[0]
                 file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
                 
+                cache_key = self.make_cache_key(video_info, quality)
                 if file_size_mb > self.telegram_limit_mb:
                     await progress_msg.edit_text("📤 الملف كبير، جاري التحضير للإرسال...")
-                    await self.handle_large_file_send(message_obj, file_path, video_info, progress_msg)
+                    await self.handle_large_file_send(message_obj, file_path, video_info, progress_msg, cache_key)
                 else:
-                    await self.send_normal_file(message_obj, file_path, video_info, progress_msg)
-                
-                # تنظيف
-                try:
-                    os.remove(file_path)
-                except:
-                    pass
+                    await self.send_normal_file(message_obj, file_path, video_info, progress_msg, cache_key)
+                state = 'done'
+            else:
+                await progress_msg.edit_text("❌ فشل في العثور على الملف المحمل!")
                 
+        except asyncio.CancelledError:
+            # إيقاف البوت: الإبقاء على السجل والملفات الجزئية للاستئناف
+            interrupted = True
+            raise
         except Exception as e:
             await progress_msg.edit_text(f"❌ فشل التحميل: {str(e)[:100]}...")
+        finally:
+            if not interrupted:
+                if self.journal:
+                    await self.journal.finish(job_id, state)
+                # تنظيف مجلد المهمة (الملف الأصلي وأي نسخة مضغوطة)
+                workspace.cleanup()
 
-    async def enhanced_progress_hook(self, d, progress_msg):
-        """شريط تقدم محسن للملفات الكبيرة"""
+    async def resume_download(self, job, progress_msg):
+        """استئناف مهمة من السجل في مجلد عملها السابق"""
+        workspace = JobWorkspace(path=job['workspace'])
+        await self.run_journaled_download(progress_msg, progress_msg, job['user_id'], job['url'], job['info'],
+                                          job['format'], job['quality'], workspace, job['size_mb'])
+
+    def format_progress(self, d):
+        """نص شريط تقدم محسن للملفات الكبيرة"""
         if d['status'] == 'downloading':
             try:
                 percent = d.get('_percent_str', '0%').strip()
@@ -275,10 +336,10 @@ class LargeFileHandler:
                 else:
                     progress_text = f"📥 جاري التحميل... {percent}\n⚡ السرعة: {speed}"
                 
-                await progress_msg.edit_text(progress_text)
+                return progress_text
                 
             except Exception:
-                pass  # تجاهل أخطاء التحديث
+                return None  # تجاهل أخطاء التنسيق
 
     def create_progress_bar(self, progress, length=20):
         """إنشاء شريط تقدم بصري"""
@@ -286,61 +347,206 @@ class LargeFileHandler:
         bar = "█" * filled + "░" * (length - filled)
         return f"[{bar}]"
 
-    async def handle_large_file_send(self, message_obj, file_path, video_info, progress_msg):
+    def make_cache_key(self, video_info, quality, file_format='mp4'):
+        """مفتاح إعادة استخدام معرف الملف (إذا كانت الذاكرة مفعلة)"""
+        if not self.file_id_cache:
+            return None
+        return self.file_id_cache.make_key(video_info, quality, file_format)
+
+    async def handle_large_file_send(self, message_obj, file_path, video_info, progress_msg, cache_key=None):
         """معالجة إرسال الملفات الكبيرة"""
         file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
         
         if file_size_mb > 2000:  # أكبر من 2 جيجا
             await progress_msg.edit_text("⚠️ الملف كبير جداً! جاري الضغط...")
-            compressed_path = await self.compress_video(file_path)
+            compressed_path = await self.compress_video(file_path, progress_msg=progress_msg)
             if compressed_path and compressed_path != file_path:
                 os.remove(file_path)  # حذف الملف الأصلي
                 file_path = compressed_path
                 file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
         
         if file_size_mb > self.telegram_limit_mb:
-            # تقسيم الملف
+            # تقسيم الملف (أجزاء قابلة للتشغيل أولاً ثم التقسيم الخام كاحتياط)
             await progress_msg.edit_text("✂️ جاري تقسيم الملف...")
+            if self.split_mode == "segment" and not file_path.endswith('.mp3'):
+                if await self.segment_and_send_file(message_obj, file_path, video_info, progress_msg):
+                    return
             await self.split_and_send_file(message_obj, file_path, video_info, progress_msg)
         else:
-            await self.send_normal_file(message_obj, file_path, video_info, progress_msg)
+            await self.send_normal_file(message_obj, file_path, video_info, progress_msg, cache_key)
 
-    async def compress_video(self, input_path, target_size_mb=1800):
-        """ضغط الفيديو لتقليل الحجم"""
-        output_path = input_path.replace('.', '_compressed.')
+    async def compress_video(self, input_path, target_size_mb=1800, progress_msg=None):
+        """ضغط الفيديو لتقليل الحجم (بدون تجميد حلقة الأحداث)"""
+        base, ext = os.path.splitext(input_path)
+        output_path = f"{base}_compressed{ext}"
         
         try:
-            # حساب bitrate المطلوب
-            probe_cmd = [
-                'ffprobe', '-v', 'quiet', '-show_entries', 'format=duration',
-                '-of', 'default=noprint_wrappers=1:nokey=1', input_path
-            ]
-            result = subprocess.run(probe_cmd, capture_output=True, text=True)
-            duration = float(result.stdout.strip())
-            
-            # حساب bitrate (بالكيلوبت/ثانية)
-            target_bitrate = int((target_size_mb * 8 * 1024) / duration * 0.9)  # 90% للأمان
-            
-            cmd = [
-                'ffmpeg', '-i', input_path,
-                '-c:v', 'libx264',
-                '-b:v', f'{target_bitrate}k',
-                '-maxrate', f'{target_bitrate * 1.2}k',
-                '-bufsize', f'{target_bitrate * 2}k',
-                '-preset', 'medium',
-                '-c:a', 'aac',
-                '-b:a', '128k',
-                output_path,
-                '-y'
-            ]
+            on_progress = None
+            reporter = None
+            if progress_msg is not None:
+                reporter = ProgressReporter(progress_msg, self.format_compress_progress)
+                
+                async def on_progress(fraction, speed):
+                    reporter.hook({'status': 'processing', 'percent': fraction * 100, 'speed': speed})
             
-            subprocess.run(cmd, check=True, capture_output=True)
+            try:
+                fits = await self.compressor.compress(
+                    input_path, output_path, target_size_mb, on_progress=on_progress,
+                    preset=self.encoder_profiles.choose(), threads=self.encoder_profiles.threads)
+            finally:
+                if reporter is not None:
+                    reporter.close()
+            if not fits:
+                logger.warning(f"⚠️ لم يصل الضغط للحجم المطلوب ({target_size_mb} ميجا)")
             return output_path
             
         except Exception as e:
             logger.error(f"خطأ في الضغط: {e}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
             return input_path  # إرجاع الملف الأصلي في حالة فشل الضغط
 
+    def format_compress_progress(self, d):
+        """نص تقدم الضغط"""
+        progress_bar = self.create_progress_bar(d['percent'] / 100)
+        return f"""
+🗜️ **جاري ضغط الفيديو...**
+
+{progress_bar} {d['percent']:.0f}%
+⚡ **السرعة:** {d.get('speed') or 'غير معروف'}
+        """
+
+    async def plan_segments(self, file_path, budget_bytes):
+        """حساب نقاط القطع عند الإطارات المفتاحية بحيث لا يتجاوز أي جزء الميزانية
+
+        تُقرأ أحجام الحزم وعلامات الإطارات المفتاحية بـ ffprobe (بدون فك ترميز)،
+        ثم يُقطع عند آخر إطار مفتاحي قبل تجاوز الحجم.
+        """
+        output = await self.media.run([
+            'ffprobe', '-v', 'error', '-show_entries', 'packet=stream_index,pts_time,size,flags',
+            '-of', 'compact=p=0', file_path
+        ], timeout=self.media.encode_timeout)
+        video_stream = (await self.media.run([
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=index',
+            '-of', 'default=noprint_wrappers=1:nokey=1', file_path
+        ])).strip()
+        
+        packets = []
+        for line in output.splitlines():
+            fields = dict(item.split('=', 1) for item in line.split('|') if '=' in item)
+            try:
+                packets.append((float(fields['pts_time']), int(fields['size']),
+                                fields['stream_index'] == video_stream and 'K' in fields.get('flags', '')))
+            except (KeyError, ValueError):
+                continue  # حزم بدون توقيت
+        packets.sort()
+        
+        cut_points = []
+        segment_bytes = 0
+        last_keyframe = None
+        for pts, size, is_keyframe in packets:
+            if is_keyframe and pts > (cut_points[-1] if cut_points else 0):
+                if segment_bytes > budget_bytes and last_keyframe is not None:
+                    # الجزء الحالي تجاوز الميزانية: القطع عند الإطار المفتاحي السابق
+                    cut_points.append(last_keyframe[0])
+                    segment_bytes -= last_keyframe[1]
+                last_keyframe = (pts, segment_bytes)
+            segment_bytes += size
+        
+        return cut_points
+
+    async def segment_video(self, file_path, attempts=3):
+        """تقسيم الفيديو إلى أجزاء MP4 مستقلة بنسخ البث (-c copy) بدون إعادة ترميز"""
+        limit_bytes = self.chunk_size_mb * 1024 * 1024
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        # هامش لحاوية MP4
+        budget = limit_bytes * 0.95
+        
+        for attempt in range(attempts):
+            # مجلد خاص بكل محاولة حتى لا يحذف المرسلون المتزامنون لنفس الملف أجزاء بعضهم
+            out_dir = tempfile.mkdtemp(prefix=f"{base_name}_segments_", dir=os.path.dirname(file_path) or '.')
+            try:
+                cut_points = await self.plan_segments(file_path, budget)
+                if not cut_points:
+                    shutil.rmtree(out_dir, ignore_errors=True)
+                    return None
+                
+                await self.media.ffmpeg([
+                    '-i', file_path,
+                    '-map', '0', '-c', 'copy',
+                    '-f', 'segment',
+                    '-segment_times', ','.join(f"{t:.3f}" for t in cut_points),
+                    '-segment_format', 'mp4',
+                    '-segment_format_options', 'movflags=+faststart',
+                    '-reset_timestamps', '1',
+                    os.path.join(out_dir, f"{base_name}_part%03d.mp4"),
+                    '-y'
+                ], cpu_bound=False)
+            except Exception as e:
+                logger.error(f"خطأ في تقسيم الفيديو: {e}")
+                shutil.rmtree(out_dir, ignore_errors=True)
+                return None
+            
+            parts = sorted(os.path.join(out_dir, f) for f in os.listdir(out_dir))
+            largest = max((os.path.getsize(p) for p in parts), default=0)
+            if parts and largest <= limit_bytes:
+                return parts
+            
+            # جزء تجاوز الحد (إطارات مفتاحية متباعدة): تقليل الميزانية والمحاولة مجدداً
+            shutil.rmtree(out_dir, ignore_errors=True)
+            budget *= limit_bytes / max(largest, 1) * 0.9
+        
+        return None
+
+    async def segment_and_send_file(self, message_obj, file_path, video_info, progress_msg):
+        """إرسال الفيديو كأجزاء قابلة للتشغيل - يرجع False للرجوع للتقسيم الخام"""
+        parts = await self.segment_video(file_path)
+        if not parts:
+            return False
+        
+        total_parts = len(parts)
+        out_dir = os.path.dirname(parts[0])
+        await progress_msg.edit_text(f"📤 جاري إرسال {total_parts} أجزاء قابلة للتشغيل...")
+        
+        def prepare_part(i):
+            if self.local_mode:
+                # الخادم المحلي يقرأ الجزء بمساره بدل تحميله في الذاكرة
+                return Path(parts[i]).absolute(), os.path.getsize(parts[i])
+            video = self.read_part(lambda: open(parts[i], 'rb'), os.path.basename(parts[i]))
+            return video, os.path.getsize(parts[i])
+        
+        def send_part(i, payload):
+            video, part_size = payload
+            caption = f"""
+📦 **جزء {i+1} من {total_parts}**
+
+🎬 **العنوان:** {video_info['title']}
+📁 **حجم الجزء:** {part_size/(1024*1024):.1f} ميجا
+            """
+            return message_obj.reply_video(video=video, caption=caption, supports_streaming=True,
+                                           read_timeout=self.upload_timeout, write_timeout=self.upload_timeout)
+        
+        try:
+            await self.send_parts(total_parts, prepare_part, send_part, progress_msg)
+            
+            await progress_msg.edit_text(f"""
+✅ **تم إرسال جميع الأجزاء!**
+
+📦 **العدد:** {total_parts} جزء
+🎬 **العنوان:** {video_info['title']}
+
+▶️ كل جزء فيديو مستقل يمكن تشغيله مباشرة
+
+🤖 شكراً لاستخدام البوت!
+            """)
+            return True
+            
+        except Exception as e:
+            await progress_msg.edit_text(f"❌ فشل في إرسال الأجزاء: {str(e)[:100]}...")
+            return True
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
     async def split_and_send_file(self, message_obj, file_path, video_info, progress_msg):
         """تقسيم وإرسال الملف"""
         file_size = os.path.getsize(file_path)
@@ -350,39 +556,38 @@ class LargeFileHandler:
         await progress_msg.edit_text(f"📤 جاري إرسال {total_chunks} أجزاء...")
         
         base_name = os.path.splitext(os.path.basename(file_path))[0]
-        
-        try:
-            with open(file_path, 'rb') as f:
-                for i in range(total_chunks):
-                    chunk_data = f.read(chunk_size)
-                    chunk_filename = f"{base_name}_part{i+1}of{total_chunks}.bin"
-                    chunk_path = os.path.join('downloads', chunk_filename)
-                    
-                    with open(chunk_path, 'wb') as chunk_file:
-                        chunk_file.write(chunk_data)
-                    
-                    # إرسال الجزء
-                    caption = f"""
+        chunk_paths = []
+        
+        def prepare_part(i):
+            offset = i * chunk_size
+            part_size = min(chunk_size, file_size - offset)
+            chunk_filename = f"{base_name}_part{i+1}of{total_chunks}.bin"
+            if self.local_mode:
+                # أجزاء الخادم المحلي كبيرة: نسخ المدى إلى ملف يرفع بمساره بدل قراءته في الذاكرة
+                chunk_path = os.path.join(os.path.dirname(file_path), chunk_filename)
+                chunk_paths.append(chunk_path)
+                with FileRange(file_path, offset, part_size, chunk_filename) as source, open(chunk_path, 'wb') as target:
+                    shutil.copyfileobj(source, target, 1024 * 1024)
+                return Path(chunk_path).absolute(), part_size
+            # القراءة مباشرة من مدى البايتات في الملف الأصلي بدون ملف مؤقت
+            document = self.read_part(lambda: FileRange(file_path, offset, part_size, chunk_filename), chunk_filename)
+            return document, part_size
+        
+        def send_part(i, payload):
+            document, part_size = payload
+            caption = f"""
 📦 **جزء {i+1} من {total_chunks}**
 
 🎬 **العنوان:** {video_info['title']}
-📁 **حجم الجزء:** {len(chunk_data)/(1024*1024):.1f} ميجا
+📁 **حجم الجزء:** {part_size/(1024*1024):.1f} ميجا
 
 💡 **لدمج الأجزاء:** استخدم أي برنامج دمج ملفات
-                    """
-                    
-                    with open(chunk_path, 'rb') as chunk_file:
-                        await message_obj.reply_document(
-                            document=chunk_file,
-                            filename=chunk_filename,
-                            caption=caption
-                        )
-                    
-                    # حذف الجزء المؤقت
-                    os.remove(chunk_path)
-                    
-                    # تحديث التقدم
-                    await progress_msg.edit_text(f"📤 تم إرسال {i+1}/{total_chunks} أجزاء...")
+            """
+            return message_obj.reply_document(document=document, caption=caption,
+                                              read_timeout=self.upload_timeout, write_timeout=self.upload_timeout)
+        
+        try:
+            await self.send_parts(total_chunks, prepare_part, send_part, progress_msg)
             
             # رسالة الانتهاء
             final_message = f"""
@@ -404,8 +609,96 @@ class LargeFileHandler:
             
         except Exception as e:
             await progress_msg.edit_text(f"❌ فشل في تقسيم الملف: {str(e)[:100]}...")
+        finally:
+            for chunk_path in chunk_paths:
+                with contextlib.suppress(OSError):
+                    os.remove(chunk_path)
+
+    async def send_parts(self, total_parts, prepare_part, send_part, progress_msg):
+        """إرسال الأجزاء بالترتيب مع تجهيز الأجزاء التالية أثناء رفع الحالي
+
+        prepare_part(i) دالة متزامنة تعمل في خيط منفصل وتقرأ الجزء للرفع،
+        و send_part(i, payload) ترجع coroutine الرفع. الرفع تسلسلي حتى تصل
+        الأجزاء للمحادثة بترتيبها، ولا يبقى في الذاكرة أكثر من
+        upload_prefetch + 1 جزء.
+        """
+        queue = asyncio.Queue()
+        loaded = asyncio.Semaphore(self.upload_prefetch + 1)
+        
+        async def produce():
+            for i in range(total_parts):
+                # لا يقرأ جزء جديد قبل انتهاء رفع جزء سابق
+                await loaded.acquire()
+                try:
+                    payload = await asyncio.to_thread(prepare_part, i)
+                except Exception as e:
+                    await queue.put((i, e))
+                    return
+                await queue.put((i, payload))
+        
+        producer = asyncio.create_task(produce())
+        try:
+            for sent in range(1, total_parts + 1):
+                i, payload = await queue.get()
+                if isinstance(payload, Exception):
+                    raise payload
+                await self.send_with_retry(lambda: send_part(i, payload))
+                payload = None
+                loaded.release()
+                
+                try:
+                    await progress_msg.edit_text(f"📤 تم إرسال {sent}/{total_parts} أجزاء...")
+                except Exception:
+                    pass  # تجاهل أخطاء التحديث
+        finally:
+            producer.cancel()
+
+    @staticmethod
+    def read_part(open_source, filename):
+        """قراءة الجزء في InputFile (يقرأ الملف كاملاً في الذاكرة)"""
+        with open_source() as source:
+            return InputFile(source, filename=filename)
+
+    async def send_with_retry(self, send, attempts=5):
+        """تنفيذ طلب رفع مع احترام RetryAfter وإعادة المحاولة عند أخطاء الاتصال
+
+        BadRequest خطأ دائم فيرفع مباشرة، وانتهاء المهلة لا يعاد لأن الرفع
+        قد يكون وصل فعلاً وإعادته تكرر الجزء في المحادثة.
+        """
+        for attempt in range(attempts):
+            # انتظار انتهاء أي مهلة فرضها تلقرام على البوت
+            delay = self._upload_resume_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            
+            try:
+                return await send()
+            except RetryAfter as e:
+                if attempt == attempts - 1:
+                    raise
+                retry_after = e.retry_after
+                if hasattr(retry_after, 'total_seconds'):
+                    retry_after = retry_after.total_seconds()
+                self._upload_resume_at = max(self._upload_resume_at, time.monotonic() + retry_after)
+                logger.warning(f"⏳ تلقرام طلب الانتظار {retry_after} ثانية")
+            except BadRequest:
+                raise
+            except TimedOut as e:
+                logger.warning(f"⚠️ انتهت مهلة الرفع (قد يكون الجزء وصل)، لن يعاد إرساله: {e}")
+                return None
+            except NetworkError as e:
+                if attempt == attempts - 1:
+                    raise
+                logger.warning(f"⚠️ خطأ اتصال أثناء الرفع، إعادة المحاولة: {e}")
+                await asyncio.sleep(2 ** attempt)
+
+    def upload_source(self, file_path):
+        """مصدر الرفع: المسار المحلي في وضع الخادم المحلي (بدون نقل البايتات) أو الملف مفتوحاً"""
+        if self.local_mode:
+            return contextlib.nullcontext(Path(file_path).absolute())
+        return open(file_path, 'rb')
 
-    async def send_normal_file(self, message_obj, file_path, video_info, progress_msg):
+    async def send_normal_file(self, message_obj, file_path, video_info, progress_msg, cache_key=None):
         """إرسال الملف العادي"""
         file_size = os.path.getsize(file_path) / (1024 * 1024)
         
@@ -423,20 +716,24 @@ class LargeFileHandler:
         
         try:
             if file_path.endswith('.mp3'):
-                with open(file_path, 'rb') as audio_file:
-                    await message_obj.reply_audio(
+                with self.upload_source(file_path) as audio_file:
+                    sent_message = await message_obj.reply_audio(
                         audio=audio_file,
                         caption=caption,
                         title=video_info['title']
                     )
             else:
-                with open(file_path, 'rb') as video_file:
-                    await message_obj.reply_video(
+                with self.upload_source(file_path) as video_file:
+                    sent_message = await message_obj.reply_video(
                         video=video_file,
                         caption=caption,
                         supports_streaming=True
                     )
             
+            # حفظ معرف الملف لإعادة استخدامه
+            if self.file_id_cache:
+                await self.file_id_cache.put(cache_key, sent_message)
+            
             await progress_msg.edit_text("✅ تم الإرسال بنجاح!")
             
         except Exception as e:
@@ -480,37 +777,12 @@ class LargeFileHandler:
             format_selector = 'best[height<=480]/best'
         else:
             format_selector = 'best'
+        max_height = int(quality) if quality.isdigit() else None
+        format_selector = self.format_planner.selector(file_data.get('info'), format_selector, max_height)
         
-        timestamp = int(datetime.now().timestamp())
-        filename = f'downloads/compressed_{quality}_{user_id}_{timestamp}.%(ext)s'
-        
-        ydl_opts = {
-            'outtmpl': filename,
-            'format': format_selector,
-            'merge_output_format': 'mp4',
-            'progress_hooks': [lambda d: asyncio.create_task(self.enhanced_progress_hook(d, progress_msg))],
-        }
+        workspace = JobWorkspace('downloads', f"compressed_{quality}_{user_id}")
+        video_info = file_data.get('info') or {'title': 'فيديو مضغوط', 'duration': 0}
+        size_mb = (file_data.get('file_info') or {}).get('size_mb', 0)
         
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-            
-            # البحث عن الملف
-            download_dir = 'downloads'
-            files = [f for f in os.listdir(download_dir) if f.startswith(f'compressed_{quality}_{user_id}_{timestamp}')]
-            
-            if files:
-                file_path = os.path.join(download_dir, files[0])
-                video_info = file_data.get('info', {'title': 'فيديو مضغوط', 'duration': 0})
-                
-                await self.handle_large_file_send(query.message, file_path, video_info, progress_msg)
-                
-                try:
-                    os.remove(file_path)
-                except:
-                    pass
-            else:
-                await progress_msg.edit_text("❌ فشل في العثور على الملف المحمل!")
-                
-        except Exception as e:
-            await progress_msg.edit_text(f"❌ فشل التحميل: {str(e)[:100]}...")
+        await self.run_journaled_download(query.message, progress_msg, user_id, url, video_info,
+                                          format_selector, quality, workspace, size_mb)
@@ -1,18 +1,29 @@
 import asyncio
 import os
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
-import yt_dlp
 import aiohttp
 import aiofiles
-from urllib.parse import urlparse
 import re
-from datetime import datetime
-import json
 import subprocess
 import sys
+import time
 from large_file_handler import LargeFileHandler
+from download_executor import DownloadExecutor
+from download_profiles import DownloadProfiles
+import platforms
+from metadata_cache import MetadataCache
+from file_id_cache import FileIdCache
+from single_flight import SingleFlight
+from job_scheduler import JobScheduler, QueueFullError
+from progress_reporter import ProgressReporter
+from stats_store import StatsStore
+from stats_aggregator import StatsAggregator
+from stream_fetcher import StreamFetcher
+from job_workspace import JobWorkspace
+from disk_manager import DiskManager, DiskSpaceError
+from job_journal import JobJournal
 
 # إعداد التسجيل
 logging.basicConfig(
@@ -24,7 +35,26 @@ logger = logging.getLogger(__name__)
 class VideoDownloaderBot:
     def __init__(self, bot_token):
         self.bot_token = bot_token
-        self.app = Application.builder().token(bot_token).build()
+        # معالجة التحديثات بالتوازي (حدود التحميل تفرضها جدولة المهام)
+        builder = (
+            Application.builder()
+            .token(bot_token)
+            .concurrent_updates(True)
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+        )
+        
+        # خادم Bot API محلي: رفع حتى 2000 ميجا وإرسال الملفات بمسارها بدل بايتاتها
+        self.local_bot_api = os.getenv("LOCAL_BOT_API_URL", "").rstrip('/')
+        if self.local_bot_api:
+            builder = (
+                builder
+                .base_url(f"{self.local_bot_api}/bot")
+                .base_file_url(f"{self.local_bot_api}/file/bot")
+                .local_mode(True)
+            )
+            logger.info(f"🏠 استخدام خادم Bot API محلي: {self.local_bot_api}")
+        self.app = builder.build()
         self.downloads_dir = "downloads"
         self.sessions_dir = "sessions"
         self.stats_file = "stats.json"
@@ -33,14 +63,42 @@ class VideoDownloaderBot:
         os.makedirs(self.downloads_dir, exist_ok=True)
         os.makedirs(self.sessions_dir, exist_ok=True)
         
+        # منفذ التحميل خارج حلقة الأحداث
+        self.executor = DownloadExecutor(profiles=DownloadProfiles())
+        
+        # معرفات الملفات المرسلة سابقاً لإعادة استخدامها
+        self.file_id_cache = FileIdCache()
+        
+        # سجل التحميلات الجارية لاستئنافها بعد إعادة التشغيل
+        self.job_journal = JobJournal()
+        
         # معالج الملفات الكبيرة
-        self.large_file_handler = LargeFileHandler()
+        self.large_file_handler = LargeFileHandler(executor=self.executor, file_id_cache=self.file_id_cache,
+                                                   local_mode=bool(self.local_bot_api), journal=self.job_journal)
+        
+        # دمج التحميلات المتطابقة المتزامنة
+        self.single_flight = SingleFlight()
+        
+        # حجز مساحة القرص لكل مهمة وتنظيف الملفات اليتيمة
+        self.disk_manager = DiskManager(self.downloads_dir)
+        
+        # جدولة المهام الثقيلة (تحميل، ضغط، تقسيم) مع حجز المساحة قبل التشغيل
+        self.scheduler = JobScheduler(disk=self.disk_manager)
+        # إعداد الترميز يتبع عدد المهام المنتظرة
+        self.large_file_handler.encoder_profiles.pressure = lambda: self.scheduler.queued
+        
+        # ذاكرة مؤقتة لمعلومات الروابط
+        self.metadata_cache = MetadataCache()
+        
+        # بث الملفات الصغيرة مباشرة للرفع بدون المرور بالقرص (STREAM_SMALL_FILES)
+        self.stream_fetcher = StreamFetcher(max_mb=min(self.large_file_handler.telegram_limit_mb, 50))
         
         # تحديث yt-dlp عند البداية
         self.update_ytdlp()
         
-        # إحصائيات البوت
-        self.stats = self.load_stats()
+        # إحصائيات البوت (مع استيراد stats.json القديم إن وجد)
+        self.stats_store = StatsStore(legacy_json=self.stats_file)
+        self.stats_aggregator = StatsAggregator(self.stats_store)
         
         self.setup_handlers()
 
@@ -67,68 +125,14 @@ class VideoDownloaderBot:
         except Exception as e:
             logger.warning(f"⚠️ فشل تحديث yt-dlp: {e}")
 
-    def load_stats(self):
-        """تحميل الإحصائيات من الملف"""
-        try:
-            with open(self.stats_file, 'r', encoding='utf-8') as f:
-                stats = json.load(f)
-                if isinstance(stats.get('users'), list):
-                    stats['users'] = set(stats['users'])
-                return stats
-        except FileNotFoundError:
-            return {
-                "total_downloads": 0,
-                "users": set(),
-                "platforms": {"youtube": 0, "twitter": 0, "tiktok": 0, "instagram": 0, "facebook": 0, "other": 0},
-                "start_date": datetime.now().isoformat()
-            }
-
-    def save_stats(self):
-        """حفظ الإحصائيات"""
-        try:
-            stats_to_save = self.stats.copy()
-            stats_to_save["users"] = list(self.stats["users"])
-            with open(self.stats_file, 'w', encoding='utf-8') as f:
-                json.dump(stats_to_save, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"خطأ في حفظ الإحصائيات: {e}")
-
     def detect_platform(self, url):
-        """تحديد نوع المنصة من الرابط - محسن"""
-        url_lower = url.lower()
-        domain = urlparse(url).netloc.lower()
-        
-        # يوتيوب
-        if any(x in domain for x in ['youtube.com', 'youtu.be', 'm.youtube.com', 'music.youtube.com']):
-            return 'youtube'
-        
-        # تويتر/X
-        elif any(x in domain for x in ['twitter.com', 'x.com', 't.co', 'mobile.twitter.com']):
-            return 'twitter'
-        
-        # تيك توك
-        elif any(x in domain for x in ['tiktok.com', 'vm.tiktok.com', 'vt.tiktok.com', 'm.tiktok.com']):
-            return 'tiktok'
-        
-        # إنستقرام - تحسين التعرف
-        elif any(x in domain for x in ['instagram.com', 'instagr.am', 'www.instagram.com']):
-            return 'instagram'
-        
-        # فيسبوك - تحسين التعرف
-        elif any(x in domain for x in ['facebook.com', 'fb.watch', 'm.facebook.com', 'www.facebook.com', 'fb.com']):
-            return 'facebook'
-        
-        # منصات أخرى مدعومة
-        elif any(x in domain for x in ['dailymotion.com', 'vimeo.com', 'twitch.tv', 'reddit.com']):
-            return 'other'
-        
-        else:
-            return 'unknown'
+        """إعدادات المنصة (PlatformProfile) من الرابط"""
+        return platforms.detect_platform(url)
 
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """أمر البداية"""
         user = update.effective_user
-        self.stats["users"].add(user.id)
+        self.stats_aggregator.record_user(user.id)
         
         welcome_text = f"""
 🎬 مرحباً {user.first_name}! 
@@ -164,142 +168,74 @@ class VideoDownloaderBot:
         await update.message.reply_text(welcome_text, reply_markup=reply_markup)
 
     async def get_video_info(self, url):
-        """الحصول على معلومات الفيديو - محسن مع دعم أفضل للإنستقرام والفيسبوك"""
+        """الحصول على معلومات الفيديو مع استخدام الذاكرة المؤقتة"""
         platform = self.detect_platform(url)
         
-        # إعدادات أساسية محسنة
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-            'ignoreerrors': True,
-            'no_check_certificate': True,
-            'socket_timeout': 30,
-            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'referer': 'https://www.google.com/',
-            'headers': {
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Accept-Encoding': 'gzip, deflate',
-                'DNT': '1',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-            }
-        }
-        
-        # إعدادات خاصة محسنة لكل منصة
-        if platform == 'instagram':
-            ydl_opts.update({
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 15_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.0 Mobile/15E148 Safari/604.1',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                    'Accept-Language': 'en-US,en;q=0.5',
-                    'Accept-Encoding': 'gzip, deflate',
-                    'Referer': 'https://www.instagram.com/',
-                    'Origin': 'https://www.instagram.com',
-                    'DNT': '1',
-                    'Connection': 'keep-alive',
-                    'Upgrade-Insecure-Requests': '1',
-                    'Sec-Fetch-Dest': 'document',
-                    'Sec-Fetch-Mode': 'navigate',
-                    'Sec-Fetch-Site': 'none',
-                    'Cache-Control': 'max-age=0'
-                },
-                'cookiefile': None,
-                'extract_flat': False,
-            })
+        cached = await self.metadata_cache.get(url, platform.name)
+        if cached:
+            logger.info(f"⚡ معلومات من الذاكرة المؤقتة: {url}")
+            return cached
+        
+        started = time.monotonic()
+        video_info = await self.extract_video_info(url)
+        
+        # تخزين الاستخراجات الكاملة فقط (وليس نتيجة المحاولة المبسطة)
+        if video_info and video_info.get('file_info'):
+            await self.metadata_cache.set(url, platform.name, video_info, time.monotonic() - started)
+        
+        return video_info
+
+    async def extract_video_info(self, url):
+        """استخراج معلومات الفيديو - محسن مع دعم أفضل للإنستقرام والفيسبوك"""
+        platform = self.detect_platform(url)
+        
+        # إعدادات الاستخراج من سجل المنصات (نفس الترويسات المستخدمة في التحميل)
+        ydl_opts = platform.extraction_options()
+        
+        try:
+            logger.info(f"🔍 محاولة استخراج معلومات من {platform.name}: {url}")
+            info = await self.executor.extract_info(ydl_opts, url)
             
-        elif platform == 'facebook':
-            ydl_opts.update({
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                    'Accept-Language': 'en-US,en;q=0.9',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'Referer': 'https://www.facebook.com/',
-                    'Origin': 'https://www.facebook.com',
-                    'DNT': '1',
-                    'Connection': 'keep-alive',
-                    'Upgrade-Insecure-Requests': '1',
-                    'Sec-Fetch-Dest': 'document',
-                    'Sec-Fetch-Mode': 'navigate',
-                    'Sec-Fetch-Site': 'same-origin',
-                    'Cache-Control': 'max-age=0'
-                },
-                'cookiefile': None,
-            })
+            if not info:
+                logger.error("❌ لم يتم العثور على معلومات")
+                return None
             
-        elif platform == 'tiktok':
-            ydl_opts.update({
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 15_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.0 Mobile/15E148 Safari/604.1',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                    'Accept-Language': 'en-US,en;q=0.5',
-                    'Accept-Encoding': 'gzip, deflate',
-                    'Referer': 'https://www.tiktok.com/',
-                    'Origin': 'https://www.tiktok.com',
-                }
-            })
+            logger.info(f"✅ تم استخراج المعلومات: {info.get('title', 'بدون عنوان')}")
+            
+            return {
+                'id': info.get('id'),
+                'extractor_key': info.get('extractor_key'),
+                'title': info.get('title', 'غير معروف'),
+                'duration': info.get('duration', 0),
+                'thumbnail': info.get('thumbnail'),
+                'uploader': info.get('uploader', 'غير معروف'),
+                'view_count': info.get('view_count', 0),
+                'formats': info.get('formats', []),
+                'webpage_url': info.get('webpage_url', url),
+                'description': info.get('description', '')[:200] + '...' if info.get('description') else '',
+                # حجم أفضل جودة محسوب من نفس الاستخراج
+                'file_info': self.large_file_handler.estimate_file_info(info)
+            }
             
-        elif platform == 'twitter':
-            ydl_opts.update({
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                    'Accept-Language': 'en-US,en;q=0.9',
-                    'Referer': 'https://twitter.com/',
-                }
-            })
-        
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                logger.info(f"🔍 محاولة استخراج معلومات من {platform}: {url}")
-                info = ydl.extract_info(url, download=False)
-                
-                if not info:
-                    logger.error("❌ لم يتم العثور على معلومات")
-                    return None
-                
-                logger.info(f"✅ تم استخراج المعلومات: {info.get('title', 'بدون عنوان')}")
-                
-                return {
-                    'title': info.get('title', 'غير معروف'),
-                    'duration': info.get('duration', 0),
-                    'thumbnail': info.get('thumbnail'),
-                    'uploader': info.get('uploader', 'غير معروف'),
-                    'view_count': info.get('view_count', 0),
-                    'formats': info.get('formats', []),
-                    'webpage_url': info.get('webpage_url', url),
-                    'description': info.get('description', '')[:200] + '...' if info.get('description') else ''
-                }
-                
         except Exception as e:
-            logger.error(f"❌ خطأ في استخراج المعلومات من {platform}: {e}")
+            logger.error(f"❌ خطأ في استخراج المعلومات من {platform.name}: {e}")
             
             # محاولة ثانية مع إعدادات مبسطة
             try:
-                simple_opts = {
-                    'quiet': True,
-                    'no_warnings': True,
-                    'extract_flat': True,
-                    'skip_download': True,
-                    'socket_timeout': 15,
-                    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
+                simple_opts = platform.extraction_options(extract_flat=True, skip_download=True, socket_timeout=15)
                 
-                with yt_dlp.YoutubeDL(simple_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    if info:
-                        return {
-                            'title': str(info.get('title', 'فيديو'))[:100],
-                            'duration': 0,
-                            'thumbnail': None,
-                            'uploader': str(info.get('uploader', 'غير معروف'))[:50],
-                            'view_count': 0,
-                            'formats': [],
-                            'webpage_url': url,
-                            'description': ''
-                        }
+                info = await self.executor.extract_info(simple_opts, url)
+                if info:
+                    return {
+                        'title': str(info.get('title', 'فيديو'))[:100],
+                        'duration': 0,
+                        'thumbnail': None,
+                        'uploader': str(info.get('uploader', 'غير معروف'))[:50],
+                        'view_count': 0,
+                        'formats': [],
+                        'webpage_url': url,
+                        'description': ''
+                    }
             except Exception as e2:
                 logger.error(f"❌ فشلت المحاولة الثانية: {e2}")
             
@@ -327,7 +263,7 @@ class VideoDownloaderBot:
             return
         
         platform = self.detect_platform(url)
-        if platform == 'unknown':
+        if not platform.supported:
             await update.message.reply_text(
                 "❌ المنصة غير مدعومة حالياً!\n\n"
                 "🌐 **المنصات المدعومة:**\n"
@@ -337,7 +273,7 @@ class VideoDownloaderBot:
         
         # رسالة انتظار
         waiting_msg = await update.message.reply_text(
-            f"🔍 جاري تحليل الرابط من {platform.title()}...\n"
+            f"🔍 جاري تحليل الرابط من {platform.label}...\n"
             "⏳ قد يستغرق هذا بضع ثوانٍ..."
         )
         
@@ -347,16 +283,16 @@ class VideoDownloaderBot:
             
             if not video_info:
                 error_msg = f"""
-❌ فشل في تحليل الرابط من {platform.title()}!
+❌ فشل في تحليل الرابط من {platform.label}!
 
 🔧 **حلول مقترحة:**
 • تأكد من أن الرابط يعمل في المتصفح
 • جرب نسخ الرابط مرة أخرى
 • تأكد من أن الفيديو عام وليس خاص
 """
-                if platform in ['instagram', 'facebook']:
+                if platform.name in ['instagram', 'facebook']:
                     error_msg += f"""
-📱 **نصائح خاصة بـ {platform.title()}:**
+📱 **نصائح خاصة بـ {platform.label}:**
 • تأكد من أن الحساب عام
 • جرب فتح الرابط في متصفح خفي
 • تأكد من عدم انتهاء صلاحية الرابط
@@ -365,8 +301,8 @@ class VideoDownloaderBot:
                 await waiting_msg.edit_text(error_msg)
                 return
             
-            # فحص حجم الملف
-            file_info = await self.large_file_handler.check_file_size(url)
+            # حجم الملف محسوب مسبقاً من نفس الاستخراج
+            file_info = video_info.get('file_info')
             size_info = ""
             if file_info and file_info['size_mb'] > 0:
                 size_mb = file_info['size_mb']
@@ -393,7 +329,7 @@ class VideoDownloaderBot:
 📺 **القناة:** {video_info['uploader']}
 ⏱️ **المدة:** {duration_str}
 👀 **المشاهدات:** {view_count_str}
-🌐 **المنصة:** {platform.title()}
+🌐 **المنصة:** {platform.label}
 {size_info}
 
 📝 **الوصف:** {video_info['description']}
@@ -407,7 +343,7 @@ class VideoDownloaderBot:
             ]
             
             # إضافة خيارات للملفات الكبيرة
-            if file_info and file_info['size_mb'] > 50:
+            if file_info and file_info['size_mb'] > self.large_file_handler.telegram_limit_mb:
                 keyboard.append([InlineKeyboardButton("🗜️ ضغط وتحميل", callback_data=f"compress_auto_{user_id}")])
                 keyboard.append([InlineKeyboardButton("✂️ تقسيم وتحميل", callback_data=f"split_auto_{user_id}")])
             
@@ -422,7 +358,7 @@ class VideoDownloaderBot:
             context.user_data[f'video_info_{user_id}'] = {
                 'url': url,
                 'info': video_info,
-                'platform': platform,
+                'platform': platform.name,
                 'file_info': file_info
             }
             
@@ -514,22 +450,158 @@ class VideoDownloaderBot:
         if data.startswith("compress_"):
             quality = data.split("_")[1]
             if quality in ["720", "480"]:
-                await self.large_file_handler.handle_compression_callback(query, context, quality)
+                await self.run_job(query, context, user_id, 'compress',
+                                   lambda: self.large_file_handler.handle_compression_callback(query, context, quality))
             elif quality == "auto":
-                await self.handle_auto_compress(query, context, user_id)
+                await self.run_job(query, context, user_id, 'compress',
+                                   lambda: self.handle_auto_compress(query, context, user_id))
             return
         
         if data.startswith("split_"):
-            await self.handle_split_download(query, context, user_id)
+            await self.run_job(query, context, user_id, 'download',
+                               lambda: self.handle_split_download(query, context, user_id))
             return
         
         if data.startswith("audio_only_"):
-            await self.handle_audio_only(query, context, user_id)
+            # إعادة الإرسال من الذاكرة لا تحتاج قائمة الانتظار ولا مساحة القرص
+            if await self.resend_cached(query, context, user_id, data):
+                return
+            await self.run_job(query, context, user_id, 'audio',
+                               lambda: self.handle_audio_only(query, context, user_id))
             return
         
         # معالجة التحميل العادي
         if data.startswith("download_"):
-            await self.process_download(query, context, data, user_id)
+            if await self.resend_cached(query, context, user_id, data):
+                self.stats_aggregator.record_download(user_id, context.user_data[f'video_info_{user_id}']['platform'])
+                return
+            lane = 'audio' if data.startswith("download_audio") else 'download'
+            await self.run_job(query, context, user_id, lane,
+                               lambda: self.process_download(query, context, data, user_id))
+
+    def requested_format(self, data, video_data):
+        """الجودة والصيغة المطلوبة (مفتاح إعادة الاستخدام)"""
+        if "audio" in data:
+            return "audio", "mp3"
+        quality = "high" if "high" in data else "medium"
+        if self.exceeds_send_limit(video_data, quality):
+            quality = "best"
+        return quality, "mp4"
+
+    def exceeds_send_limit(self, video_data, quality):
+        """هل لا توجد صيغة بالجودة المطلوبة ضمن حد الإرسال (توجيه لمعالج الملفات الكبيرة)"""
+        limit = self.large_file_handler.telegram_limit_mb
+        planned = self.large_file_handler.format_planner.plan(
+            video_data['info'] or {}, 1080 if quality == "high" else 720, limit)
+        if planned:
+            return False
+        # بدون أحجام صيغ كافية للتخطيط: الحجم التقديري لأفضل صيغة
+        file_info = video_data.get('file_info')
+        return bool(file_info and file_info['size_mb'] > limit)
+
+    async def resend_cached(self, query, context, user_id, data):
+        """إعادة إرسال فورية عبر file_id قبل دخول قائمة الانتظار - يرجع True عند النجاح"""
+        video_data = context.user_data.get(f'video_info_{user_id}')
+        if not video_data:
+            return False
+        
+        video_info = video_data['info']
+        cache_key = self.file_id_cache.make_key(video_info, *self.requested_format(data, video_data))
+        if not await self.file_id_cache.resend(query.message, cache_key, self.build_caption(video_info),
+                                               title=video_info['title']):
+            return False
+        
+        keyboard = [[InlineKeyboardButton("🔗 شارك البوت", callback_data="share")]]
+        await query.edit_message_text("✅ تم الإرسال بنجاح!", reply_markup=InlineKeyboardMarkup(keyboard))
+        return True
+
+    def estimate_job_cost(self, context, user_id, lane):
+        """تقدير تكلفة المهمة بالميجابايت من الحجم أو المدة المعروفة"""
+        video_data = context.user_data.get(f'video_info_{user_id}') or {}
+        file_info = video_data.get('file_info') or {}
+        duration = (video_data.get('info') or {}).get('duration') or 0
+        
+        if lane == 'audio':
+            # صوت 192 كيلوبت/ثانية
+            return duration * 192 / 8 / 1024
+        
+        size_mb = file_info.get('size_mb') or duration * 0.25  # تقدير 2 ميجابت/ثانية
+        if lane == 'compress':
+            # إعادة الترميز أغلى بكثير من التحميل
+            size_mb *= 3
+        return size_mb
+
+    def estimate_disk_bytes(self, context, user_id, lane):
+        """المساحة المؤقتة المطلوبة للمهمة (الملف + الدمج أو الضغط أو الأجزاء)"""
+        video_data = context.user_data.get(f'video_info_{user_id}') or {}
+        file_info = video_data.get('file_info') or {}
+        duration = (video_data.get('info') or {}).get('duration') or 0
+        
+        if lane == 'audio':
+            size_mb = duration * 192 / 8 / 1024 * 1.5
+        else:
+            size_mb = (file_info.get('size_mb') or duration * 0.25) * (2.5 if lane == 'compress' else 2)
+        return max(size_mb, 50) * 1024 * 1024
+
+    async def run_job(self, query, context, user_id, lane, factory):
+        """تنفيذ مهمة ثقيلة عبر قائمة الانتظار حسب تكلفتها"""
+        cost = self.estimate_job_cost(context, user_id, lane)
+        disk_bytes = self.estimate_disk_bytes(context, user_id, lane)
+        
+        try:
+            # المساحة تحجز قبل تشغيل المهمة (انتظار في القائمة أو رفض)
+            await self.scheduler.submit(user_id, factory, query.message, cost=cost, lane=lane, disk_bytes=disk_bytes)
+        except QueueFullError as e:
+            await query.edit_message_text(
+                f"🚦 البوت مشغول حالياً: {e}\n\n"
+                "🔄 جرب مرة أخرى بعد قليل"
+            )
+        except DiskSpaceError as e:
+            await query.edit_message_text(
+                f"💾 لا توجد مساحة كافية على الخادم: {e}\n\n"
+                "🔄 جرب مرة أخرى لاحقاً أو اختر جودة أقل"
+            )
+
+    async def resume_jobs(self):
+        """إعادة جدولة التحميلات التي انقطعت بإيقاف البوت وإبلاغ أصحابها"""
+        try:
+            jobs = await self.job_journal.unfinished()
+        except Exception as e:
+            logger.error(f"خطأ في قراءة سجل المهام: {e}")
+            return
+        
+        for job in jobs:
+            self.disk_manager.protect(job['workspace'])
+            asyncio.create_task(self.resume_job(job))
+        if jobs:
+            logger.info(f"♻️ استئناف {len(jobs)} تحميل منقطع")
+
+    async def resume_job(self, job):
+        """استئناف مهمة واحدة من السجل عبر قائمة الانتظار"""
+        title = job['info'].get('title') or job['url']
+        try:
+            progress_msg = await self.app.bot.send_message(
+                job['chat_id'],
+                f"♻️ تمت إعادة تشغيل البوت، جاري استئناف التحميل:\n🎬 {title}"
+            )
+        except Exception as e:
+            logger.error(f"خطأ في إبلاغ المستخدم بالاستئناف: {e}")
+            await self.job_journal.finish(job['job_id'], 'failed')
+            JobWorkspace(path=job['workspace']).cleanup()
+            return
+        
+        disk_bytes = max((job['size_mb'] or 0) * 2, 50) * 1024 * 1024
+        
+        try:
+            await self.scheduler.submit(job['user_id'], lambda: self.large_file_handler.resume_download(job, progress_msg),
+                                        progress_msg, cost=job['size_mb'] or 0, disk_bytes=disk_bytes)
+        except (QueueFullError, DiskSpaceError) as e:
+            await self.job_journal.finish(job['job_id'], 'failed')
+            JobWorkspace(path=job['workspace']).cleanup()
+            try:
+                await progress_msg.edit_text(f"❌ تعذر استئناف التحميل: {e}\n🔄 أرسل الرابط مرة أخرى")
+            except Exception:
+                pass
 
     async def handle_auto_compress(self, query, context, user_id):
         """معالجة الضغط التلقائي"""
@@ -569,43 +641,40 @@ class VideoDownloaderBot:
         url = video_data['url']
         video_info = video_data['info']
         
+        # إعادة إرسال فورية إذا سبق رفع نفس الصوت
+        cache_key = self.file_id_cache.make_key(video_info, "audio", "mp3")
+        if await self.file_id_cache.resend(query.message, cache_key, self.build_caption(video_info), title=video_info['title']):
+            await query.edit_message_text("✅ تم الإرسال بنجاح!")
+            return
+        
         progress_msg = await query.edit_message_text("🎵 جاري تحميل الصوت...")
         
-        timestamp = int(datetime.now().timestamp())
-        filename = f'downloads/audio_{user_id}_{timestamp}.%(ext)s'
+        workspace = JobWorkspace(self.downloads_dir, f"audio_{user_id}")
         
-        ydl_opts = {
-            'outtmpl': filename,
-            'format': 'bestaudio/best',
-            'postprocessors': [{
+        ydl_opts = platforms.get_profile(video_data['platform']).download_options(
+            outtmpl=workspace.outtmpl(),
+            format='bestaudio/best',
+            postprocessors=[{
                 'key': 'FFmpegExtractAudio',
                 'preferredcodec': 'mp3',
                 'preferredquality': '192',
             }],
-            'progress_hooks': [lambda d: asyncio.create_task(self.large_file_handler.enhanced_progress_hook(d, progress_msg))],
-        }
+            ignoreerrors=False,
+        )
+        reporter = ProgressReporter(progress_msg, self.large_file_handler.format_progress)
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-            
-            # البحث عن الملف
-            download_dir = 'downloads'
-            files = [f for f in os.listdir(download_dir) if f.startswith(f'audio_{user_id}_{timestamp}')]
+            files = await self.executor.download(ydl_opts, url, reporter, platform=video_data['platform'])
             
             if files:
-                file_path = os.path.join(download_dir, files[0])
-                await self.large_file_handler.send_normal_file(query, file_path, video_info, progress_msg)
-                
-                try:
-                    os.remove(file_path)
-                except:
-                    pass
+                await self.large_file_handler.send_normal_file(query.message, files[0], video_info, progress_msg, cache_key)
             else:
                 await progress_msg.edit_text("❌ فشل في تحميل الصوت!")
                 
         except Exception as e:
             await progress_msg.edit_text(f"❌ فشل التحميل: {str(e)[:100]}...")
+        finally:
+            workspace.cleanup()
 
     async def process_download(self, query, context, data, user_id):
         """معالجة عملية التحميل - محسن مع إصلاح مشكلة الملفات الكبيرة"""
@@ -621,59 +690,77 @@ class VideoDownloaderBot:
         file_info = video_data.get('file_info')
         
         # تحديث الإحصائيات
-        self.stats["total_downloads"] += 1
-        if platform in self.stats["platforms"]:
-            self.stats["platforms"][platform] += 1
-        else:
-            self.stats["platforms"]["other"] += 1
-        self.save_stats()
+        self.stats_aggregator.record_download(user_id, platform)
         
         # رسالة التحميل
         progress_msg = await query.edit_message_text(
-            f"🚀 بدء التحميل من {platform.title()}...\n"
+            f"🚀 بدء التحميل من {platforms.get_profile(platform).label}...\n"
             "⏳ قد يستغرق هذا بضع دقائق..."
         )
         
+        quality, file_format = self.requested_format(data, video_data)
+        cache_key = self.file_id_cache.make_key(video_info, quality, file_format)
+        
         try:
-            # فحص إذا كان الملف كبير وتوجيه للمعالج المناسب
-            if file_info and file_info['size_mb'] > 50:
+            # إعادة إرسال فورية إذا رفع الملف أثناء الانتظار في القائمة
+            caption = self.build_caption(video_info)
+            if await self.file_id_cache.resend(query.message, cache_key, caption, title=video_info['title']):
+                keyboard = [[InlineKeyboardButton("🔗 شارك البوت", callback_data="share")]]
+                await query.edit_message_text("✅ تم الإرسال بنجاح!", reply_markup=InlineKeyboardMarkup(keyboard))
+                return
+            
+            # لا توجد صيغة بالجودة المطلوبة ضمن حد الإرسال: توجيه لمعالج الملفات الكبيرة
+            if quality == "best":
                 logger.info(f"ملف كبير تم اكتشافه: {file_info['size_mb']} ميجا")
-                await self.large_file_handler.handle_large_file(query, context, url, video_info)
+                await self.large_file_handler.handle_large_file(query, context, url, video_info, file_info)
                 return
             
-            # التحميل العادي للملفات الصغيرة
-            if "audio" in data:
-                file_path = await self.download_audio(url, video_info, progress_msg, platform)
-            else:
-                quality = "high" if "high" in data else "medium"
-                file_path = await self.download_video(url, video_info, quality, progress_msg, platform)
+            # بث مباشر للملفات الصغيرة إن أمكن
+            if quality != "audio" and await self.stream_small_file(query, video_info, quality, progress_msg, cache_key):
+                return
             
-            if file_path and os.path.exists(file_path):
-                # فحص حجم الملف المحمل
-                file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
-                logger.info(f"حجم الملف المحمل: {file_size_mb:.1f} ميجا")
-                
-                if file_size_mb > 50:
-                    # الملف كبير، استخدم معالج الملفات الكبيرة
-                    await progress_msg.edit_text("📤 الملف كبير، جاري التحضير للإرسال...")
-                    await self.large_file_handler.handle_large_file_send(query, file_path, video_info, progress_msg)
+            # التحميل العادي للملفات الصغيرة (طلبات متطابقة متزامنة تشترك في تحميل واحد)
+            flight_key = cache_key or (url, quality, file_format)
+            file_path = None
+            try:
+                if quality == "audio":
+                    file_path = await self.single_flight.run(
+                        flight_key, lambda progress: self.download_audio(url, video_info, progress, platform), progress_msg)
                 else:
-                    # الملف صغير، إرسال عادي
-                    await self.send_file(query, file_path, video_info)
+                    file_path = await self.single_flight.run(
+                        flight_key, lambda progress: self.download_video(url, video_info, quality, progress, platform), progress_msg)
                 
-                # حذف الملف بعد الإرسال
-                try:
-                    os.remove(file_path)
-                except:
-                    pass
-            else:
-                await progress_msg.edit_text(
-                    "❌ فشل في التحميل!\n\n"
-                    "🔧 **حلول مقترحة:**\n"
-                    "• جرب جودة أقل\n"
-                    "• تأكد من أن الفيديو متاح\n"
-                    "• جرب رابط مختلف"
-                )
+                if file_path and os.path.exists(file_path):
+                    # فحص حجم الملف المحمل
+                    file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
+                    logger.info(f"حجم الملف المحمل: {file_size_mb:.1f} ميجا")
+                    
+                    if file_size_mb > self.large_file_handler.telegram_limit_mb:
+                        # الملف كبير، استخدم معالج الملفات الكبيرة
+                        await progress_msg.edit_text("📤 الملف كبير، جاري التحضير للإرسال...")
+                        # نسخة خاصة لكل مستخدم: معالج الملفات الكبيرة قد يضغط الملف ويحذفه
+                        # بينما الملف المشترك ملك single_flight حتى آخر مستخدم
+                        private = JobWorkspace(self.downloads_dir, f"send_{user_id}")
+                        try:
+                            await self.large_file_handler.handle_large_file_send(
+                                query.message, private.adopt(file_path), video_info, progress_msg, cache_key)
+                        finally:
+                            private.cleanup()
+                    else:
+                        # الملف صغير، إرسال عادي
+                        await self.send_file(query, file_path, video_info, cache_key)
+                else:
+                    await progress_msg.edit_text(
+                        "❌ فشل في التحميل!\n\n"
+                        "🔧 **حلول مقترحة:**\n"
+                        "• جرب جودة أقل\n"
+                        "• تأكد من أن الفيديو متاح\n"
+                        "• جرب رابط مختلف"
+                    )
+            finally:
+                # حذف الملف بعد انتهاء آخر مستخدم مشترك في التحميل
+                if self.single_flight.release(flight_key):
+                    JobWorkspace.discard(file_path)
                 
         except Exception as e:
             logger.error(f"خطأ في التحميل: {e}")
@@ -685,114 +772,70 @@ class VideoDownloaderBot:
 
     async def download_video(self, url, video_info, quality="medium", progress_msg=None, platform="unknown"):
         """تحميل الفيديو - محسن"""
-        timestamp = int(datetime.now().timestamp())
-        filename = f"{self.downloads_dir}/video_{platform}_{timestamp}.%(ext)s"
+        workspace = JobWorkspace(self.downloads_dir, f"video_{platform}")
+        profile = platforms.get_profile(platform)
+        max_height = 1080 if quality == "high" else 720
+        
+        # اختيار صيغة يتسع حجمها لحد الإرسال المباشر قبل التحميل
+        format_selector = self.large_file_handler.format_planner.selector(
+            video_info, profile.format_selector(max_height), max_height,
+            budget_mb=self.large_file_handler.telegram_limit_mb)
+        
+        # الترويسات والمهل من سجل المنصات
+        ydl_opts = profile.download_options(
+            outtmpl=workspace.outtmpl(),
+            format=format_selector,
+            merge_output_format='mp4',
+            writesubtitles=False,
+            writeautomaticsub=False,
+            writeinfojson=False,
+            writethumbnail=False,
+        )
         
-        # إعدادات محسنة حسب الجودة والمنصة
-        if quality == "high":
-            format_selector = 'best[height<=1080]/best'
-        else:
-            format_selector = 'best[height<=720]/best'
-        
-        ydl_opts = {
-            'outtmpl': filename,
-            'format': format_selector,
-            'merge_output_format': 'mp4',
-            'writesubtitles': False,
-            'writeautomaticsub': False,
-            'ignoreerrors': True,
-            'no_warnings': True,
-            'extractaudio': False,
-            'audioformat': 'mp3',
-            'embed_subs': False,
-            'writeinfojson': False,
-            'writethumbnail': False,
-            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'referer': 'https://www.google.com/',
-            'socket_timeout': 60,
-            'retries': 3,
-        }
-        
-        if progress_msg:
-            ydl_opts['progress_hooks'] = [lambda d: asyncio.create_task(self.progress_hook(d, progress_msg))]
-        
-        # إعدادات خاصة لكل منصة
-        if platform == 'instagram':
-            ydl_opts.update({
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 15_0 like Mac OS X) AppleWebKit/605.1.15',
-                }
-            })
-        elif platform == 'facebook':
-            ydl_opts.update({
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                }
-            })
-        elif platform == 'tiktok':
-            ydl_opts.update({
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 14_6 like Mac OS X) AppleWebKit/605.1.15',
-                }
-            })
+        reporter = ProgressReporter(progress_msg, self.format_progress) if progress_msg else None
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-            
-            # البحث عن الملف المحمل
-            download_files = [f for f in os.listdir(self.downloads_dir) 
-                            if f.startswith(f'video_{platform}_{timestamp}')]
-            
-            if download_files:
-                return os.path.join(self.downloads_dir, download_files[0])
-            else:
-                return None
+            files = await self.executor.download(ydl_opts, url, reporter, platform=platform,
+                                                 size_mb=(video_info.get('file_info') or {}).get('size_mb', 0))
+            if files:
+                return files[0]
+            workspace.cleanup()
+            return None
                 
         except Exception as e:
             logger.error(f"خطأ في تحميل الفيديو: {e}")
+            workspace.cleanup()
             return None
 
     async def download_audio(self, url, video_info, progress_msg, platform="unknown"):
         """تحميل الصوت - محسن"""
-        timestamp = int(datetime.now().timestamp())
-        filename = f"{self.downloads_dir}/audio_{platform}_{timestamp}.%(ext)s"
+        workspace = JobWorkspace(self.downloads_dir, f"audio_{platform}")
         
-        ydl_opts = {
-            'outtmpl': filename,
-            'format': 'bestaudio/best',
-            'postprocessors': [{
+        ydl_opts = platforms.get_profile(platform).download_options(
+            outtmpl=workspace.outtmpl(),
+            format='bestaudio/best',
+            postprocessors=[{
                 'key': 'FFmpegExtractAudio',
                 'preferredcodec': 'mp3',
                 'preferredquality': '192',
             }],
-            'ignoreerrors': True,
-            'no_warnings': True,
-            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'socket_timeout': 60,
-            'retries': 3,
-            'progress_hooks': [lambda d: asyncio.create_task(self.progress_hook(d, progress_msg))],
-        }
+        )
+        reporter = ProgressReporter(progress_msg, self.format_progress)
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-            
-            # البحث عن الملف المحمل
-            download_files = [f for f in os.listdir(self.downloads_dir) 
-                            if f.startswith(f'audio_{platform}_{timestamp}')]
-            
-            if download_files:
-                return os.path.join(self.downloads_dir, download_files[0])
-            else:
-                return None
+            files = await self.executor.download(ydl_opts, url, reporter, platform=platform)
+            if files:
+                return files[0]
+            workspace.cleanup()
+            return None
                 
         except Exception as e:
             logger.error(f"خطأ في تحميل الصوت: {e}")
+            workspace.cleanup()
             return None
 
-    async def progress_hook(self, d, progress_msg):
-        """تحديث شريط التقدم - محسن"""
+    def format_progress(self, d):
+        """نص شريط التقدم لحدث تحميل"""
         if d['status'] == 'downloading':
             try:
                 percent = d.get('_percent_str', '0%').strip()
@@ -815,42 +858,90 @@ class VideoDownloaderBot:
                 else:
                     progress_text = f"📥 جاري التحميل... {percent}\n⚡ السرعة: {speed}"
                 
-                await progress_msg.edit_text(progress_text)
+                return progress_text
                 
             except Exception:
-                pass  # تجاهل أخطاء التحديث
+                return None  # تجاهل أخطاء التنسيق
 
-    async def send_file(self, query, file_path, video_info):
-        """إرسال الملف للمستخدم - محسن"""
-        try:
-            file_size = os.path.getsize(file_path) / (1024 * 1024)  # بالميجا
-            
-            caption = f"""
+    def build_caption(self, video_info, file_size=None):
+        """نص وصف الملف المرسل"""
+        size_line = f"📁 **الحجم:** {file_size:.1f} ميجابايت\n" if file_size is not None else ""
+        return f"""
 ✅ **تم التحميل بنجاح!**
 
 🎬 **العنوان:** {video_info['title']}
-📁 **الحجم:** {file_size:.1f} ميجابايت
-⏱️ **المدة:** {self.format_duration(video_info.get('duration', 0))}
+{size_line}⏱️ **المدة:** {self.format_duration(video_info.get('duration', 0))}
 
 🤖 شكراً لاستخدام البوت!
             """
+
+    async def stream_small_file(self, query, video_info, quality, progress_msg, cache_key=None):
+        """تحميل ملف صغير في الذاكرة وإرساله مباشرة - يرجع False للرجوع للتحميل العادي"""
+        if not self.stream_fetcher.enabled:
+            return False
+        max_height = 1080 if quality == "high" else 720
+        fmt = self.stream_fetcher.pick_format(video_info, max_height)
+        if not fmt:
+            return False
+        # البث للصيغ المدمجة فقط: لا يستخدم إذا كان التحميل العادي سيعطي دقة أعلى (مثل زوج DASH)
+        planned = self.large_file_handler.format_planner.plan(
+            video_info, max_height, self.large_file_handler.telegram_limit_mb)
+        if planned and (fmt.get('height') or 0) < (planned.get('height') or 0):
+            return False
+        
+        reporter = ProgressReporter(progress_msg, self.format_progress)
+        try:
+            buffer, size = await self.stream_fetcher.fetch(fmt, reporter.hook)
+        except Exception as e:
+            logger.error(f"خطأ في البث المباشر: {e}")
+            return False
+        finally:
+            reporter.close()
+        
+        try:
+            caption = self.build_caption(video_info, size / (1024 * 1024))
+            sent_message = await query.message.reply_video(
+                video=InputFile(buffer, filename=f"video.{fmt.get('ext', 'mp4')}"),
+                caption=caption,
+                supports_streaming=True
+            )
+            await self.file_id_cache.put(cache_key, sent_message)
+            
+            keyboard = [[InlineKeyboardButton("🔗 شارك البوت", callback_data="share")]]
+            await query.edit_message_text("✅ تم الإرسال بنجاح!", reply_markup=InlineKeyboardMarkup(keyboard))
+            return True
+        except Exception as e:
+            logger.error(f"خطأ في إرسال الملف المبثوث: {e}")
+            return False
+        finally:
+            buffer.close()
+
+    async def send_file(self, query, file_path, video_info, cache_key=None):
+        """إرسال الملف للمستخدم - محسن"""
+        try:
+            file_size = os.path.getsize(file_path) / (1024 * 1024)  # بالميجا
+            
+            caption = self.build_caption(video_info, file_size)
             
             if file_path.endswith('.mp3'):
-                with open(file_path, 'rb') as audio_file:
-                    await query.message.reply_audio(
+                with self.large_file_handler.upload_source(file_path) as audio_file:
+                    sent_message = await query.message.reply_audio(
                         audio=audio_file,
                         caption=caption,
                         title=video_info['title'],
                         performer=video_info.get('uploader', 'Unknown')
                     )
             else:
-                with open(file_path, 'rb') as video_file:
-                    await query.message.reply_video(
+                with self.large_file_handler.upload_source(file_path) as video_file:
+                    sent_message = await query.message.reply_video(
                         video=video_file,
                         caption=caption,
                         supports_streaming=True
                     )
             
+            # حفظ معرف الملف لإعادة استخدامه
+            await self.file_id_cache.put(cache_key, sent_message)
+            
             # زر مشاركة البوت
             keyboard = [[InlineKeyboardButton("🔗 شارك البوت", callback_data="share")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -861,14 +952,18 @@ class VideoDownloaderBot:
             logger.error(f"خطأ في إرسال الملف: {e}")
             if "too large" in str(e).lower():
                 await query.edit_message_text("📤 الملف كبير، جاري التقسيم...")
-                await self.large_file_handler.split_and_send_file(query, file_path, video_info, query)
+                await self.large_file_handler.split_and_send_file(query.message, file_path, video_info, query.message)
             else:
                 await query.edit_message_text(f"❌ فشل في إرسال الملف: {str(e)[:100]}...")
 
     async def show_stats(self, query):
         """عرض الإحصائيات - محسن"""
-        total_users = len(self.stats['users'])
-        total_downloads = self.stats['total_downloads']
+        await self.stats_aggregator.flush()
+        stats = await asyncio.to_thread(self.stats_store.summary)
+        total_users = stats['total_users']
+        total_downloads = stats['total_downloads']
+        cache_stats = self.metadata_cache.stats()
+        youtube_speed = self.executor.profiles.throughput('youtube')
         
         stats_text = f"""
 📊 **إحصائيات البوت**
@@ -877,15 +972,18 @@ class VideoDownloaderBot:
 📥 **إجمالي التحميلات:** {total_downloads}
 
 🌐 **التحميلات حسب المنصة:**
-📺 يوتيوب: {self.stats['platforms'].get('youtube', 0)}
-🐦 تويتر: {self.stats['platforms'].get('twitter', 0)}
-🎵 تيك توك: {self.stats['platforms'].get('tiktok', 0)}
-📸 إنستقرام: {self.stats['platforms'].get('instagram', 0)}
-👥 فيسبوك: {self.stats['platforms'].get('facebook', 0)}
-🌐 أخرى: {self.stats['platforms'].get('other', 0)}
-
-📅 **تاريخ البداية:** {self.stats['start_date'][:10]}
+📺 يوتيوب: {stats['platforms'].get('youtube', 0)}
+🐦 تويتر: {stats['platforms'].get('twitter', 0)}
+🎵 تيك توك: {stats['platforms'].get('tiktok', 0)}
+📸 إنستقرام: {stats['platforms'].get('instagram', 0)}
+👥 فيسبوك: {stats['platforms'].get('facebook', 0)}
+🌐 أخرى: {stats['platforms'].get('other', 0)}
+
+📅 **تاريخ البداية:** {stats['start_date'][:10]}
+📈 **تحميلات اليوم:** {stats['today_downloads']}
 ⚡ **متوسط التحميل:** {total_downloads/max(total_users,1):.1f} لكل مستخدم
+🗂️ **الذاكرة المؤقتة:** {cache_stats['hits']} إصابة / {cache_stats['misses']} إخفاق (وفرت {cache_stats['saved_seconds']:.0f} ثانية)
+📶 **سرعة التحميل (يوتيوب):** {f'{youtube_speed:.1f} ميجا/ثانية' if youtube_speed else 'غير مقاسة بعد'}
 
 🔥 **جديد:** دعم الملفات حتى 2 جيجابايت!
         """
@@ -1071,7 +1169,7 @@ https://www.facebook.com/watch?v=1234567890
 📺 **القناة:** {info['uploader']}
 ⏱️ **المدة:** {self.format_duration(info['duration'])}
 👀 **المشاهدات:** {view_count_formatted}
-🌐 **المنصة:** {platform.title()}
+🌐 **المنصة:** {platforms.get_profile(platform).label}
 🔗 **الرابط:** {info['webpage_url']}
 """
 
@@ -1083,7 +1181,7 @@ https://www.facebook.com/watch?v=1234567890
             else:
                 detailed_text += f"\n📁 **الحجم:** {size_mb:.0f} ميجابايت"
             
-            if size_mb > 50:
+            if size_mb > self.large_file_handler.telegram_limit_mb:
                 detailed_text += "\n⚠️ **ملف كبير:** سيتم تقسيمه أو ضغطه"
 
         detailed_text += f"""
@@ -1117,10 +1215,29 @@ https://www.facebook.com/watch?v=1234567890
         self.app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_url))
         self.app.add_handler(CallbackQueryHandler(self.download_callback))
 
+    async def post_init(self, application):
+        """تشغيل المهام الخلفية بعد تهيئة التطبيق"""
+        self.stats_aggregator.start()
+        # استئناف التحميلات المنقطعة قبل تشغيل المنظف حتى لا يحذف ملفاتها الجزئية
+        await self.resume_jobs()
+        self.disk_manager.start()
+        # قياس إعدادات الترميز في الخلفية (إذا كان مفعلاً)
+        asyncio.create_task(self.large_file_handler.encoder_profiles.ensure_benchmark())
+
+    async def post_shutdown(self, application):
+        """إيقاف المهام الخلفية قبل إغلاق التطبيق"""
+        await self.stats_aggregator.stop()
+        await self.disk_manager.stop()
+
     def run(self):
         """تشغيل البوت"""
         logger.info("🚀 بدء تشغيل البوت المحسن مع دعم الملفات الكبيرة...")
-        self.app.run_polling()
+        try:
+            self.app.run_polling()
+        finally:
+            # كتابة أي إحصائيات متبقية
+            self.stats_aggregator.flush_now()
+            self.executor.shutdown(wait=False)
 
 # تشغيل البوت
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+import os
+import json
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MediaProcessError(Exception):
+    """فشل أو انتهاء مهلة أمر ffmpeg/ffprobe"""
+
+
+class MediaProcessor:
+    """تشغيل ffmpeg/ffprobe بشكل غير متزامن مع تقدم حي وإلغاء ومهلة
+
+    عمليات الترميز الثقيلة محدودة بعدد العمال (MEDIA_WORKERS) حتى لا تستهلك
+    كل المعالج، أما الفحص ونسخ البث فلا يحتاجان لمقعد.
+    """
+
+    def __init__(self, max_workers=None, probe_timeout=None, encode_timeout=None):
+        self.max_workers = max_workers or int(os.getenv("MEDIA_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+        self.probe_timeout = probe_timeout or float(os.getenv("FFPROBE_TIMEOUT", "120"))
+        self.encode_timeout = encode_timeout or float(os.getenv("FFMPEG_TIMEOUT", "3600"))
+        self._slots = asyncio.Semaphore(self.max_workers)
+
+    async def run(self, cmd, timeout=None):
+        """تشغيل أمر قصير وإرجاع مخرجاته النصية"""
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout or self.probe_timeout)
+        except asyncio.TimeoutError:
+            await self._kill(process)
+            raise MediaProcessError(f"انتهت مهلة {cmd[0]}")
+        except asyncio.CancelledError:
+            await self._kill(process)
+            raise
+
+        if process.returncode != 0:
+            raise MediaProcessError(f"{cmd[0]} فشل: {stderr.decode(errors='ignore')[-300:]}")
+        return stdout.decode(errors='ignore')
+
+    async def probe(self, path):
+        """معلومات الملف (الصيغة والمسارات) من ffprobe"""
+        output = await self.run([
+            'ffprobe', '-v', 'error', '-print_format', 'json',
+            '-show_format', '-show_streams', path
+        ])
+        return json.loads(output)
+
+    async def duration(self, path):
+        """مدة الملف بالثواني"""
+        info = await self.probe(path)
+        return float(info.get('format', {}).get('duration') or 0)
+
+    async def ffmpeg(self, args, duration=None, on_progress=None, timeout=None, cpu_bound=True):
+        """تشغيل ffmpeg مع قراءة التقدم من -progress pipe:1
+
+        on_progress(fraction, speed): دالة async تستدعى مع كل تحديث.
+        """
+        cmd = ['ffmpeg', '-hide_banner', '-nostats', '-v', 'error', '-progress', 'pipe:1', *args]
+
+        if cpu_bound:
+            async with self._slots:
+                return await self._ffmpeg(cmd, duration, on_progress, timeout)
+        return await self._ffmpeg(cmd, duration, on_progress, timeout)
+
+    async def _ffmpeg(self, cmd, duration, on_progress, timeout):
+        """تنفيذ ffmpeg ومتابعته"""
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        # تفريغ stderr بالتوازي حتى لا يمتلئ الأنبوب ويتوقف ffmpeg
+        stderr_task = asyncio.create_task(process.stderr.read())
+
+        try:
+            await asyncio.wait_for(self._read_progress(process, duration, on_progress), timeout or self.encode_timeout)
+            await process.wait()
+        except asyncio.TimeoutError:
+            await self._kill(process)
+            await self._cancel(stderr_task)
+            raise MediaProcessError("انتهت مهلة ffmpeg")
+        except asyncio.CancelledError:
+            await self._kill(process)
+            await self._cancel(stderr_task)
+            raise
+
+        stderr = await stderr_task
+        if process.returncode != 0:
+            raise MediaProcessError(f"ffmpeg فشل: {stderr.decode(errors='ignore')[-300:]}")
+
+    @staticmethod
+    async def _cancel(task):
+        """إلغاء مهمة فرعية وانتظار انتهائها"""
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    async def _read_progress(self, process, duration, on_progress):
+        """تحليل مخرجات -progress (مفتاح=قيمة) وإبلاغ التقدم"""
+        fields = {}
+        async for raw_line in process.stdout:
+            key, _, value = raw_line.decode(errors='ignore').strip().partition('=')
+            fields[key] = value
+            if key != 'progress':
+                continue
+
+            if on_progress and duration:
+                out_time_us = fields.get('out_time_us') or fields.get('out_time_ms')
+                try:
+                    fraction = min(1.0, int(out_time_us) / 1_000_000 / duration)
+                except (TypeError, ValueError):
+                    fraction = None
+                if fraction is not None:
+                    try:
+                        await on_progress(fraction, fields.get('speed', '').strip())
+                    except Exception:
+                        pass  # تجاهل أخطاء التحديث
+            fields = {}
+
+    async def _kill(self, process):
+        """إنهاء العملية وانتظارها"""
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
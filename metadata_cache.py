@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from atomic_json import write_json_atomic
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qsl, urlencode
+from platforms import get_profile
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis اختياري
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+def normalize_url(url, platform):
+    """توحيد الرابط ليصبح مفتاحاً ثابتاً للتخزين المؤقت"""
+    parsed = urlparse(url.strip())
+    netloc = parsed.netloc.lower()
+    for prefix in ('www.', 'm.', 'mobile.'):
+        if netloc.startswith(prefix):
+            netloc = netloc[len(prefix):]
+            break
+
+    path = parsed.path.rstrip('/') or '/'
+    query = sorted(parse_qsl(parsed.query))
+
+    if platform == 'youtube':
+        # youtu.be/ID و youtube.com/watch?v=ID نفس الفيديو
+        if netloc == 'youtu.be':
+            return f"youtube:{path.strip('/')}"
+        video_id = dict(query).get('v')
+        if video_id:
+            return f"youtube:{video_id}"
+        if path.startswith('/shorts/'):
+            return f"youtube:{path.split('/')[2]}"
+
+    return f"{platform}:{netloc}{path}" + (f"?{urlencode(query)}" if query else "")
+
+
+class MetadataCache:
+    """ذاكرة مؤقتة لمعلومات الروابط: طبقة LRU في الذاكرة + طبقة Redis أو قرص اختيارية"""
+
+    def __init__(self, max_entries=None, redis_url=None, cache_dir=None):
+        self.max_entries = max_entries or int(os.getenv("METADATA_CACHE_SIZE", "512"))
+        self.redis_url = redis_url or os.getenv("REDIS_URL")
+        self.cache_dir = cache_dir or os.getenv("METADATA_CACHE_DIR")
+
+        self._memory = OrderedDict()  # المفتاح -> (وقت الانتهاء، المعلومات، زمن الاستخراج)
+        self._redis = None
+
+        if self.redis_url:
+            if aioredis is not None:
+                self._redis = aioredis.from_url(self.redis_url)
+            else:
+                logger.warning("⚠️ REDIS_URL محدد لكن مكتبة redis غير مثبتة")
+        elif self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+        # عدادات الأداء
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    async def get(self, url, platform):
+        """جلب المعلومات من الذاكرة المؤقتة إن كانت صالحة"""
+        key = normalize_url(url, platform)
+        now = time.time()
+
+        entry = self._memory.get(key)
+        if entry and entry[0] > now:
+            self._memory.move_to_end(key)
+            return self._hit(entry)
+        if entry:
+            del self._memory[key]
+
+        entry = await self._backend_get(key)
+        if entry and entry[0] > now:
+            self._remember(key, entry)
+            return self._hit(entry)
+
+        self.misses += 1
+        return None
+
+    async def set(self, url, platform, info, extract_seconds=0.0):
+        """حفظ المعلومات مع مدة صلاحية حسب المنصة"""
+        key = normalize_url(url, platform)
+        ttl = get_profile(platform).cache_ttl
+        entry = (time.time() + ttl, info, extract_seconds)
+        self._remember(key, entry)
+
+        try:
+            await self._backend_set(key, entry, ttl)
+        except Exception as e:
+            logger.warning(f"⚠️ فشل حفظ المعلومات في التخزين الدائم: {e}")
+
+    def stats(self):
+        """إحصائيات الذاكرة المؤقتة"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0,
+            'saved_seconds': self.saved_seconds,
+            'entries': len(self._memory),
+        }
+
+    def _hit(self, entry):
+        """تسجيل إصابة وإرجاع نسخة من المعلومات"""
+        self.hits += 1
+        self.saved_seconds += entry[2]
+        return dict(entry[1])
+
+    def _remember(self, key, entry):
+        """إضافة عنصر لطبقة الذاكرة مع إخراج الأقدم"""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_path(self, key):
+        """مسار ملف العنصر على القرص"""
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    async def _backend_get(self, key):
+        """القراءة من الطبقة الثانية"""
+        try:
+            if self._redis is not None:
+                raw = await self._redis.get(f"meta:{key}")
+                return tuple(json.loads(raw)) if raw else None
+            if self.cache_dir:
+                return await asyncio.to_thread(self._disk_read, self._disk_path(key))
+        except Exception as e:
+            logger.warning(f"⚠️ فشل قراءة التخزين الدائم: {e}")
+        return None
+
+    async def _backend_set(self, key, entry, ttl):
+        """الكتابة في الطبقة الثانية"""
+        if self._redis is not None:
+            await self._redis.set(f"meta:{key}", json.dumps(entry, ensure_ascii=False), ex=ttl)
+        elif self.cache_dir:
+            await asyncio.to_thread(self._disk_write, self._disk_path(key), entry)
+
+    def _disk_read(self, path):
+        """قراءة عنصر من القرص"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return tuple(json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def _disk_write(self, path, entry):
+        """كتابة عنصر على القرص بشكل ذري"""
+        write_json_atomic(path, entry)
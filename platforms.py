@@ -0,0 +1,165 @@
+from urllib.parse import urlparse
+
+# ترويسات مشتركة لكل المنصات
+BASE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+MOBILE_SAFARI = ('Mozilla/5.0 (iPhone; CPU iPhone OS 15_0 like Mac OS X) AppleWebKit/605.1.15 '
+                 '(KHTML, like Gecko) Version/15.0 Mobile/15E148 Safari/604.1')
+
+
+class PlatformProfile:
+    """إعدادات منصة واحدة: الترويسات، تفضيل الصيغ، المهل، حدود السرعة، مدة التخزين وضبط التحميل
+
+    تحسب إعدادات yt-dlp الأساسية مرة واحدة عند الاستيراد، وتبنى منها كل
+    إعدادات الاستخراج والتحميل حتى تطلب المنصة دائماً بنفس البصمة.
+    """
+
+    def __init__(self, name, label, domains=(), headers=None, format_template='best[height<={height}]/best',
+                 socket_timeout=30, download_timeout=60, retries=3, rate_limit=None, sleep_requests=0,
+                 cache_ttl=1800, download_tuning=None, supported=True):
+        self.name = name
+        self.label = label
+        self.domains = tuple(domains)
+        self.headers = {**BASE_HEADERS, **(headers or {})}
+        self.format_template = format_template
+        self.socket_timeout = socket_timeout
+        self.download_timeout = download_timeout
+        self.retries = retries
+        self.rate_limit = rate_limit
+        self.sleep_requests = sleep_requests
+        self.cache_ttl = cache_ttl
+        self.download_tuning = download_tuning or {'concurrent_fragment_downloads': 4, 'buffersize': 512 * 1024}
+        self.supported = supported
+
+        self._extract_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': False,
+            'ignoreerrors': True,
+            'no_check_certificate': True,
+            'socket_timeout': socket_timeout,
+            'http_headers': self.headers,
+        }
+        if sleep_requests:
+            self._extract_opts['sleep_interval_requests'] = sleep_requests
+
+        self._download_opts = {
+            'no_warnings': True,
+            'ignoreerrors': True,
+            'socket_timeout': download_timeout,
+            'retries': retries,
+            'fragment_retries': retries + 2,
+            'http_headers': self.headers,
+        }
+        if rate_limit:
+            self._download_opts['ratelimit'] = rate_limit
+
+    def matches(self, domain):
+        """هل ينتمي النطاق لهذه المنصة"""
+        return any(domain == d or domain.endswith(f".{d}") for d in self.domains)
+
+    def extraction_options(self, **overrides):
+        """إعدادات استخراج المعلومات (نسخة جديدة في كل مرة)"""
+        return {**self._extract_opts, **overrides}
+
+    def download_options(self, **overrides):
+        """إعدادات التحميل (نسخة جديدة في كل مرة)"""
+        return {**self._download_opts, **overrides}
+
+    def format_selector(self, max_height=None):
+        """محدد الصيغة المفضل للمنصة حتى الارتفاع المطلوب"""
+        if not max_height:
+            return 'best'
+        return self.format_template.format(height=max_height)
+
+    def __repr__(self):
+        return f"PlatformProfile({self.name!r})"
+
+
+PLATFORMS = {
+    'youtube': PlatformProfile(
+        'youtube', 'YouTube',
+        domains=('youtube.com', 'youtu.be'),
+        cache_ttl=3 * 3600,
+        download_tuning={'concurrent_fragment_downloads': 8, 'http_chunk_size': 10 * 1024 * 1024,
+                         'buffersize': 1024 * 1024},
+    ),
+    'twitter': PlatformProfile(
+        'twitter', 'Twitter',
+        domains=('twitter.com', 'x.com', 't.co'),
+        headers={'Accept-Language': 'en-US,en;q=0.9', 'Referer': 'https://twitter.com/'},
+        cache_ttl=3600,
+    ),
+    'tiktok': PlatformProfile(
+        'tiktok', 'TikTok',
+        domains=('tiktok.com',),
+        headers={
+            'User-Agent': MOBILE_SAFARI,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Referer': 'https://www.tiktok.com/',
+            'Origin': 'https://www.tiktok.com',
+        },
+        format_template='best',
+        download_tuning={'concurrent_fragment_downloads': 2, 'buffersize': 512 * 1024},
+    ),
+    'instagram': PlatformProfile(
+        'instagram', 'Instagram',
+        domains=('instagram.com', 'instagr.am'),
+        headers={
+            'User-Agent': MOBILE_SAFARI,
+            'Referer': 'https://www.instagram.com/',
+            'Origin': 'https://www.instagram.com',
+            'Sec-Fetch-Dest': 'document',
+            'Sec-Fetch-Mode': 'navigate',
+            'Sec-Fetch-Site': 'none',
+            'Cache-Control': 'max-age=0',
+        },
+        format_template='best',
+    ),
+    'facebook': PlatformProfile(
+        'facebook', 'Facebook',
+        domains=('facebook.com', 'fb.watch', 'fb.com'),
+        headers={
+            'Accept-Language': 'en-US,en;q=0.9',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Referer': 'https://www.facebook.com/',
+            'Origin': 'https://www.facebook.com',
+            'Sec-Fetch-Dest': 'document',
+            'Sec-Fetch-Mode': 'navigate',
+            'Sec-Fetch-Site': 'same-origin',
+            'Cache-Control': 'max-age=0',
+        },
+        download_tuning={'concurrent_fragment_downloads': 6, 'http_chunk_size': 10 * 1024 * 1024,
+                         'buffersize': 1024 * 1024},
+    ),
+    'other': PlatformProfile(
+        'other', 'Other',
+        domains=('dailymotion.com', 'vimeo.com', 'twitch.tv', 'reddit.com'),
+        cache_ttl=3600,
+    ),
+}
+
+UNKNOWN = PlatformProfile('unknown', 'Unknown', supported=False)
+
+
+def get_profile(name):
+    """إعدادات المنصة بالاسم (unknown إذا لم تكن معروفة)"""
+    return PLATFORMS.get(name, UNKNOWN)
+
+
+def detect_platform(url):
+    """إعدادات المنصة من نطاق الرابط"""
+    domain = urlparse(url).netloc.lower().split(':')[0]
+    for profile in PLATFORMS.values():
+        if profile.matches(domain):
+            return profile
+    return UNKNOWN
+
@@ -0,0 +1,100 @@
+import os
+import time
+import asyncio
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressReporter:
+    """تقرير تقدم مجمع لكل مهمة
+
+    يستقبل أحداث yt-dlp من خيوط العمل ويعدل الرسالة على الأكثر كل
+    min_interval ثانية أو عند تغير النسبة بمقدار min_percent_step، مع تجاهل
+    النصوص المكررة. الأحداث داخل فترة التهدئة تؤجل ولا تهمل: تطبق آخر
+    حالة عند انتهاء الفترة.
+    """
+
+    def __init__(self, progress_msg, formatter, min_interval=None, min_percent_step=None, min_gap=1.0):
+        self.progress_msg = progress_msg
+        self.formatter = formatter
+        self.min_interval = min_interval or float(os.getenv("PROGRESS_INTERVAL", "4"))
+        self.min_percent_step = min_percent_step or float(os.getenv("PROGRESS_PERCENT_STEP", "10"))
+        self.min_gap = min_gap
+
+        self._loop = asyncio.get_running_loop()
+        self._lock = threading.Lock()
+        self._latest = None
+        self._scheduled = False
+        self._closed = False
+        self._last_edit = 0.0
+        self._last_percent = None
+        self._last_text = None
+
+    def hook(self, d):
+        """hook لـ yt-dlp أو ffmpeg - آمن للاستدعاء من أي خيط"""
+        if d.get('status') not in ('downloading', 'processing'):
+            return
+
+        with self._lock:
+            if self._closed:
+                return
+            self._latest = d
+            if self._scheduled:
+                return
+
+            elapsed = time.monotonic() - self._last_edit
+            percent = self.percent(d)
+            jumped = (percent is not None and self._last_percent is not None
+                      and percent - self._last_percent >= self.min_percent_step)
+            first = self._last_percent is None and self._last_edit == 0.0
+
+            if first or elapsed >= self.min_interval or (jumped and elapsed >= self.min_gap):
+                delay = 0
+            else:
+                # داخل فترة التهدئة: تحديث مؤجل لبقية الفترة بآخر حالة حتى لا تبقى الرسالة قديمة
+                delay = (self.min_gap if jumped else self.min_interval) - elapsed
+            self._scheduled = True
+
+        self._loop.call_soon_threadsafe(self._schedule_flush, delay)
+
+    def _schedule_flush(self, delay):
+        """جدولة تطبيق آخر حالة (من خيط حلقة الأحداث)"""
+        if delay > 0:
+            self._loop.call_later(delay, lambda: self._loop.create_task(self._flush()))
+        else:
+            self._loop.create_task(self._flush())
+
+    async def _flush(self):
+        """تطبيق آخر حالة على الرسالة"""
+        with self._lock:
+            d = self._latest
+            self._scheduled = False
+            if self._closed or d is None:
+                return
+            self._last_edit = time.monotonic()
+            self._last_percent = self.percent(d)
+
+        try:
+            text = self.formatter(d)
+            if text and text != self._last_text:
+                self._last_text = text
+                await self.progress_msg.edit_text(text)
+        except Exception:
+            pass  # تجاهل أخطاء التحديث
+
+    def close(self):
+        """إيقاف التحديثات بعد انتهاء التحميل"""
+        with self._lock:
+            self._closed = True
+
+    @staticmethod
+    def percent(d):
+        """نسبة التقدم من حدث yt-dlp أو ffmpeg"""
+        if d.get('percent') is not None:
+            return d['percent']
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        if not total:
+            return None
+        return d.get('downloaded_bytes', 0) * 100 / total
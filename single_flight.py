@@ -0,0 +1,71 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressFanout:
+    """رسالة تقدم مشتركة تنقل كل تحديث إلى جميع المستخدمين المنتظرين"""
+
+    def __init__(self, progress_msg=None):
+        self.messages = []
+        self.add(progress_msg)
+
+    def add(self, progress_msg):
+        """إضافة رسالة تقدم مستخدم جديد"""
+        if progress_msg is not None:
+            self.messages.append(progress_msg)
+
+    async def edit_text(self, text, **kwargs):
+        """تعديل جميع رسائل التقدم بنفس النص"""
+        await asyncio.gather(*(msg.edit_text(text, **kwargs) for msg in self.messages), return_exceptions=True)
+
+
+class _Flight:
+    """تحميل جارٍ واحد مع عدد المستخدمين المرتبطين به"""
+
+    def __init__(self, task, progress):
+        self.task = task
+        self.progress = progress
+        self.refs = 1
+
+
+class SingleFlight:
+    """دمج الطلبات المتطابقة المتزامنة في تحميل واحد"""
+
+    def __init__(self):
+        self._flights = {}
+
+    async def run(self, key, factory, progress_msg=None):
+        """تشغيل factory(progress) مرة واحدة لكل مفتاح وانتظار نتيجتها
+
+        يجب استدعاء release(key) بعد الانتهاء من النتيجة في كل الحالات.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            progress = ProgressFanout(progress_msg)
+            flight = _Flight(asyncio.ensure_future(factory(progress)), progress)
+            self._flights[key] = flight
+        else:
+            flight.refs += 1
+            flight.progress.add(progress_msg)
+            logger.info(f"🔗 انضمام لتحميل جارٍ ({flight.refs} مستخدم): {key}")
+
+        # shield حتى لا يلغي خروج مستخدم واحد التحميل على الجميع
+        return await asyncio.shield(flight.task)
+
+    def release(self, key):
+        """فك ارتباط مستخدم - يرجع True إذا كان آخر المرتبطين (يمكن حذف الملف)"""
+        flight = self._flights.get(key)
+        if flight is None:
+            return True
+        flight.refs -= 1
+        if flight.refs > 0:
+            return False
+        del self._flights[key]
+        return True
+
+    @property
+    def active(self):
+        """عدد التحميلات الجارية المدمجة"""
+        return len(self._flights)
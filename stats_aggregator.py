@@ -0,0 +1,106 @@
+import os
+import asyncio
+import threading
+import time
+import logging
+from atomic_json import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+
+class StatsAggregator:
+    """تجميع الإحصائيات في الذاكرة وكتابتها دورياً في الخلفية
+
+    لا يلمس مسار التحميل القرص أبداً: تضاف الأحداث للذاكرة فقط، وتكتب
+    دفعة واحدة كل flush_interval ثانية أو عند بلوغ batch_size حدث، مع لقطة
+    JSON تكتب بشكل ذري (ملف مؤقت ثم إعادة تسمية).
+    """
+
+    def __init__(self, store, flush_interval=None, batch_size=None, snapshot_path=None):
+        self.store = store
+        self.flush_interval = flush_interval or float(os.getenv("STATS_FLUSH_INTERVAL", "15"))
+        self.batch_size = batch_size or int(os.getenv("STATS_FLUSH_BATCH", "100"))
+        self.snapshot_path = snapshot_path or os.getenv("STATS_SNAPSHOT", "sessions/stats.json")
+
+        self._lock = threading.Lock()
+        self._users = set()
+        self._downloads = []
+        self._task = None
+        self._wakeup = None
+
+    def record_user(self, user_id):
+        """تسجيل مستخدم (في الذاكرة فقط)"""
+        with self._lock:
+            self._users.add(user_id)
+        self._maybe_wake()
+
+    def record_download(self, user_id, platform):
+        """تسجيل تحميل (في الذاكرة فقط)"""
+        with self._lock:
+            self._downloads.append((user_id, platform, time.time()))
+        self._maybe_wake()
+
+    @property
+    def pending(self):
+        """عدد الأحداث غير المكتوبة"""
+        return len(self._users) + len(self._downloads)
+
+    def start(self):
+        """تشغيل مهمة الكتابة الدورية"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """إيقاف المهمة الدورية مع كتابة ما تبقى"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self):
+        """كتابة الدفعة الحالية في خيط منفصل"""
+        await asyncio.to_thread(self.flush_now)
+
+    def flush_now(self):
+        """كتابة الدفعة الحالية بشكل متزامن (تستخدم أيضاً عند الإغلاق)"""
+        with self._lock:
+            users, self._users = self._users, set()
+            downloads, self._downloads = self._downloads, []
+        if not users and not downloads:
+            return
+
+        try:
+            self.store.write_events(users=users, downloads=downloads)
+            self.write_snapshot()
+        except Exception as e:
+            logger.error(f"خطأ في حفظ الإحصائيات: {e}")
+            # إعادة الأحداث للدفعة التالية
+            with self._lock:
+                self._users |= users
+                self._downloads[:0] = downloads
+
+    def write_snapshot(self):
+        """كتابة لقطة JSON للإحصائيات بشكل ذري"""
+        if not self.snapshot_path:
+            return
+        write_json_atomic(self.snapshot_path, self.store.summary(), indent=2)
+
+    def _maybe_wake(self):
+        """كتابة مبكرة عند بلوغ حجم الدفعة"""
+        if self._wakeup is not None and self.pending >= self.batch_size:
+            self._wakeup.set()
+
+    async def _loop(self):
+        """حلقة الكتابة الدورية"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PLATFORMS = ["youtube", "twitter", "tiktok", "instagram", "facebook", "other"]
+
+
+class StatsStore:
+    """مخزن إحصائيات SQLite (وضع WAL) بأحداث تحميل وتجميعات مفهرسة"""
+
+    def __init__(self, db_path=None, legacy_json="stats.json"):
+        self.db_path = db_path or os.getenv("STATS_DB", "sessions/stats.db")
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                first_seen_day TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS download_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                day TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                platform TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS daily_platform (
+                day TEXT NOT NULL,
+                platform TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, platform)
+            );
+            CREATE TABLE IF NOT EXISTS user_totals (
+                user_id INTEGER PRIMARY KEY,
+                downloads INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_users_day ON users(first_seen_day);
+            CREATE INDEX IF NOT EXISTS idx_events_day ON download_events(day);
+            CREATE INDEX IF NOT EXISTS idx_events_user ON download_events(user_id);
+            CREATE INDEX IF NOT EXISTS idx_daily_platform ON daily_platform(platform);
+        """)
+        self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('start_date', ?)", (datetime.now().isoformat(),))
+        self._conn.commit()
+
+        if legacy_json:
+            self.migrate_json(legacy_json)
+
+    def migrate_json(self, path):
+        """استيراد stats.json القديم مرة واحدة"""
+        with self._lock:
+            if self._conn.execute("SELECT value FROM meta WHERE key='migrated'").fetchone():
+                return
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    stats = json.load(f)
+            except (FileNotFoundError, ValueError):
+                stats = None
+
+            with self._conn:
+                if stats:
+                    # التحميلات القديمة بدون تواريخ تسجل تحت يوم 'legacy'
+                    self._conn.executemany("INSERT OR IGNORE INTO users VALUES (?, 'legacy')",
+                                           [(user_id,) for user_id in stats.get('users', [])])
+                    self._conn.executemany("INSERT OR REPLACE INTO daily_platform VALUES ('legacy', ?, ?)",
+                                           list(stats.get('platforms', {}).items()))
+                    if stats.get('start_date'):
+                        self._conn.execute("UPDATE meta SET value=? WHERE key='start_date'", (stats['start_date'],))
+                    logger.info(f"📦 تم استيراد الإحصائيات القديمة من {path}")
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('migrated', '1')")
+
+    def write_events(self, users=(), downloads=()):
+        """كتابة دفعة أحداث في معاملة واحدة
+
+        users: معرفات مستخدمين، downloads: أزواج (معرف المستخدم، المنصة، الوقت اختياري)
+        """
+        today = datetime.now().strftime('%Y-%m-%d')
+        rows = []
+        for event in downloads:
+            user_id, platform = event[0], event[1]
+            ts = event[2] if len(event) > 2 else time.time()
+            if platform not in PLATFORMS:
+                platform = "other"
+            rows.append((ts, datetime.fromtimestamp(ts).strftime('%Y-%m-%d'), user_id, platform))
+
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO users VALUES (?, ?)",
+                                   [(user_id, today) for user_id in users] + [(row[2], row[1]) for row in rows])
+            self._conn.executemany("INSERT INTO download_events (ts, day, user_id, platform) VALUES (?, ?, ?, ?)", rows)
+            self._conn.executemany("""
+                INSERT INTO daily_platform VALUES (?, ?, 1)
+                ON CONFLICT(day, platform) DO UPDATE SET count = count + 1
+            """, [(row[1], row[3]) for row in rows])
+            self._conn.executemany("""
+                INSERT INTO user_totals VALUES (?, 1)
+                ON CONFLICT(user_id) DO UPDATE SET downloads = downloads + 1
+            """, [(row[2],) for row in rows])
+
+    def summary(self):
+        """ملخص الإحصائيات من الجداول المجمعة"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            conn = self._conn
+            platforms = dict(conn.execute("SELECT platform, SUM(count) FROM daily_platform GROUP BY platform").fetchall())
+            return {
+                'total_users': conn.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+                'total_downloads': sum(platforms.values()),
+                'platforms': {name: platforms.get(name, 0) for name in PLATFORMS},
+                'today_downloads': conn.execute("SELECT COALESCE(SUM(count), 0) FROM daily_platform WHERE day=?",
+                                                (today,)).fetchone()[0],
+                'today_new_users': conn.execute("SELECT COUNT(*) FROM users WHERE first_seen_day=?",
+                                                (today,)).fetchone()[0],
+                'start_date': conn.execute("SELECT value FROM meta WHERE key='start_date'").fetchone()[0],
+            }
+
+    def user_ids(self):
+        """قائمة جميع المستخدمين (للإشعارات الجماعية)"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT user_id FROM users")]
+
+    def close(self):
+        """إغلاق قاعدة البيانات"""
+        with self._lock:
+            self._conn.close()
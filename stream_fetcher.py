@@ -0,0 +1,80 @@
+import os
+import time
+import tempfile
+import logging
+import aiohttp
+from format_planner import FormatPlanner
+
+logger = logging.getLogger(__name__)
+
+
+class StreamFetcher:
+    """تحميل الملفات الصغيرة مباشرة من رابط الصيغة إلى مخزن مؤقت في الذاكرة
+
+    يتجاوز دورة الكتابة في downloads/ ثم القراءة للرفع: يبقى الملف في
+    SpooledTemporaryFile (في الذاكرة حتى spool_mb) ثم يرفع منه مباشرة.
+    يعمل فقط للصيغ المدمجة (فيديو+صوت) عبر http/https بحجم معروف.
+    """
+
+    def __init__(self, max_mb=50, spool_mb=None, chunk_kb=256, timeout=None):
+        self.enabled = os.getenv("STREAM_SMALL_FILES", "false").lower() == "true"
+        self.max_mb = max_mb
+        self.spool_mb = spool_mb or int(os.getenv("STREAM_SPOOL_MB", "50"))
+        self.chunk_size = chunk_kb * 1024
+        self.timeout = timeout or float(os.getenv("STREAM_TIMEOUT", "300"))
+
+    def pick_format(self, info, max_height=None):
+        """أفضل صيغة مدمجة يمكن تحميلها مباشرة ضمن الحد (أو None)"""
+        duration = info.get('duration') or 0
+        budget = self.max_mb * 1024 * 1024
+        best = None
+        for fmt in info.get('formats') or []:
+            if fmt.get('vcodec') in (None, 'none') or fmt.get('acodec') in (None, 'none'):
+                continue
+            if fmt.get('protocol') not in ('http', 'https') or not fmt.get('url'):
+                continue
+            if max_height and (fmt.get('height') or 0) > max_height:
+                continue
+            size = FormatPlanner.estimate_size(fmt, duration)
+            if not size or size > budget:
+                continue
+            if best is None or (fmt.get('height') or 0, fmt.get('tbr') or 0) > (best.get('height') or 0, best.get('tbr') or 0):
+                best = fmt
+        return best
+
+    async def fetch(self, fmt, progress_hook=None):
+        """تحميل الصيغة وإرجاع (المخزن المؤقت، الحجم) - المستدعي مسؤول عن إغلاقه"""
+        max_bytes = self.max_mb * 1024 * 1024
+        buffer = tempfile.SpooledTemporaryFile(max_size=self.spool_mb * 1024 * 1024)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        try:
+            async with aiohttp.ClientSession(timeout=timeout, headers=fmt.get('http_headers') or {}) as session:
+                async with session.get(fmt['url']) as response:
+                    response.raise_for_status()
+                    total = response.content_length or fmt.get('filesize') or fmt.get('filesize_approx') or 0
+                    downloaded = 0
+                    started = time.monotonic()
+
+                    async for chunk in response.content.iter_chunked(self.chunk_size):
+                        downloaded += len(chunk)
+                        if downloaded > max_bytes:
+                            raise ValueError("الملف أكبر من حد البث المباشر")
+                        buffer.write(chunk)
+
+                        if progress_hook:
+                            speed = downloaded / max(time.monotonic() - started, 0.001)
+                            progress_hook({
+                                'status': 'downloading',
+                                'downloaded_bytes': downloaded,
+                                'total_bytes': total,
+                                'speed': speed,
+                                '_percent_str': f"{downloaded * 100 / total:.1f}%" if total else "",
+                                '_speed_str': f"{speed / 1024 / 1024:.1f}MiB/s",
+                            })
+        except BaseException:
+            buffer.close()
+            raise
+
+        buffer.seek(0)
+        return buffer, downloaded
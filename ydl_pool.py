@@ -0,0 +1,84 @@
+import os
+import json
+import threading
+import logging
+import yt_dlp
+from yt_dlp.cookies import YoutubeDLCookieJar
+
+logger = logging.getLogger(__name__)
+
+
+class YoutubeDLPool:
+    """نسخ YoutubeDL طويلة العمر لكل مجموعة إعدادات مع سلة كوكيز مشتركة
+
+    إعادة استخدام النسخة تبقي اتصالات keep-alive (DNS وTCP وTLS) والكوكيز
+    بين الطلبات لنفس المنصة. كل نسخة تستخدمها مهمة واحدة فقط في كل لحظة،
+    وتستبدل بعد max_uses طلب لتفادي تراكم الحالة.
+    """
+
+    def __init__(self, max_idle=None, max_uses=None):
+        self.max_idle = max_idle or int(os.getenv("YTDL_POOL_IDLE", "4"))
+        self.max_uses = max_uses or int(os.getenv("YTDL_POOL_MAX_USES", "200"))
+        self._lock = threading.Lock()
+        self._idle = {}  # مفتاح الإعدادات -> [(نسخة، عدد الاستخدامات)]
+        self.cookiejar = YoutubeDLCookieJar()
+        self._sharing_warned = False
+
+    @staticmethod
+    def key(ydl_opts):
+        """مفتاح ثابت لمجموعة الإعدادات"""
+        return json.dumps(ydl_opts, sort_keys=True, default=repr)
+
+    def share_cookies(self, ydl):
+        """ربط النسخة بسلة الكوكيز المشتركة (ما لم تحدد ملف كوكيز خاص)"""
+        if not ydl.params.get('cookiefile') and not ydl.params.get('cookiesfrombrowser'):
+            # cookiejar خاصية تحسب مرة واحدة؛ تعيينها قبل أول طلب يجعل كل الطلبات تستخدم السلة المشتركة
+            ydl.__dict__['cookiejar'] = self.cookiejar
+            if ydl.cookiejar is not self.cookiejar and not self._sharing_warned:
+                # تغيرت طريقة تعريف cookiejar في إصدار yt-dlp المثبت
+                self._sharing_warned = True
+                logger.warning("⚠️ تعذر مشاركة الكوكيز بين نسخ YoutubeDL (تغير في yt-dlp)، كل نسخة تستخدم كوكيزها")
+        return ydl
+
+    def acquire(self, ydl_opts):
+        """نسخة غير مستخدمة لهذه الإعدادات (أو نسخة جديدة)"""
+        key = self.key(ydl_opts)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                ydl, uses = idle.pop()
+                return key, ydl, uses
+        return key, self.share_cookies(yt_dlp.YoutubeDL(ydl_opts)), 0
+
+    def release(self, key, ydl, uses):
+        """إرجاع النسخة للمجموعة أو إغلاقها إذا امتلأت أو استهلكت"""
+        uses += 1
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if uses < self.max_uses and len(idle) < self.max_idle:
+                idle.append((ydl, uses))
+                return
+        self._close(ydl)
+
+    def extract_info(self, ydl_opts, url):
+        """استخراج المعلومات بنسخة من المجموعة"""
+        key, ydl, uses = self.acquire(ydl_opts)
+        try:
+            return ydl.extract_info(url, download=False)
+        finally:
+            self.release(key, ydl, uses)
+
+    def close(self):
+        """إغلاق كل النسخ الخاملة"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for entries in idle.values():
+            for ydl, _ in entries:
+                self._close(ydl)
+
+    @staticmethod
+    def _close(ydl):
+        try:
+            ydl.close()
+        except Exception as e:
+            logger.debug(f"خطأ في إغلاق YoutubeDL: {e}")